@@ -1,25 +1,79 @@
 """
 Caching Module
-Implements LRU (Least Recently Used) caching for HTTP responses
+Implements LRU-style caching for HTTP responses, approximated with
+per-entry access counters (evict the least used entry)
 """
 
+import hashlib
+import sys
 import time
 import threading
-from collections import OrderedDict
+import weakref
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
-@dataclass
+# One object per cache entry: drop the per-instance __dict__ where supported
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+def _strip_weak(tag: str) -> str:
+    """Drop the W/ weakness prefix from an entity tag"""
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class CachedResponse:
     """Stores response data and metadata"""
     status_code: int
-    headers: bytes
-    body: bytes
-    timestamp: float
+    wire: bytes  # Status line + headers + body, ready to write to the client
+    header_size: int  # Length of the status line and headers within wire
+    timestamp: float  # time.monotonic() seconds at insertion
     original_url: str
+    etag: str  # Quoted entity tag sent with the response
+    not_modified: bytes  # Ready-made 304 response for a matching If-None-Match
+    
+    @property
+    def headers(self) -> bytes:
+        """Status line and headers, including the blank line"""
+        return self.wire[:self.header_size]
+    
+    @property
+    def body(self) -> bytes:
+        """Response body"""
+        return self.wire[self.header_size:]
+    
+    def etag_matches(self, if_none_match: str) -> bool:
+        """Check an If-None-Match header value (weak comparison)"""
+        if if_none_match.strip() == '*':
+            return True
+        etag = _strip_weak(self.etag)
+        return any(_strip_weak(tag.strip()) == etag
+                   for tag in if_none_match.split(','))
+
+
+def _with_etag(headers: bytes, body: bytes) -> Tuple[bytes, str]:
+    """
+    Return headers carrying an ETag, and that ETag
+    
+    An ETag from the origin is kept; otherwise one is derived from a hash
+    of the body and inserted before the blank line ending the headers.
+    """
+    start = headers.lower().find(b'\r\netag:')
+    if start >= 0:
+        start += len(b'\r\netag:')
+        end = headers.find(b'\r\n', start)
+        return headers, headers[start:end].strip().decode('latin-1')
+    
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    return headers[:-2] + b'ETag: %s\r\n\r\n' % etag.encode(), etag
+
 
 class LRUCache:
-    """Thread-safe LRU Cache implementation"""
+    """Thread-safe cache sharded by URL hash, with counter-based eviction"""
+    
+    NUM_SHARDS = 16  # Must be a power of two
+    MAX_COUNT = 1 << 20  # Halve a shard's counters once one exceeds this
+    CLOCK_RESOLUTION = 1.0  # Seconds between updates of the cached clock
     
     def __init__(self, max_size_bytes: int = 50 * 1024 * 1024, ttl_seconds: int = 300):
         """
@@ -29,68 +83,127 @@ class LRUCache:
             max_size_bytes: Maximum memory usage in bytes (default 50MB)
             ttl_seconds: Time to live for cache entries (default 5 mins)
         """
-        self.cache = OrderedDict()
-        self.current_size = 0
+        # Each shard has its own entries, access counters, lock and byte
+        # budget so that concurrent requests for different URLs don't
+        # contend on one lock
+        self._shards = [{} for _ in range(self.NUM_SHARDS)]
+        self._counts = [{} for _ in range(self.NUM_SHARDS)]
+        self._locks = [threading.Lock() for _ in range(self.NUM_SHARDS)]
+        self._sizes = [0] * self.NUM_SHARDS
+        self._shard_cap = max_size_bytes // self.NUM_SHARDS
         self.max_size = max_size_bytes
         self.ttl = ttl_seconds
-        self.lock = threading.Lock()
+        
+        # Coarse clock for TTL checks, refreshed by a background thread so
+        # cache hits don't read the system clock. The thread only holds a
+        # weak reference, and stops on close() or once the cache is collected.
+        self._now = time.monotonic()
+        self._stop = threading.Event()
+        weakref.finalize(self, self._stop.set)
+        threading.Thread(target=self._tick,
+                         args=(weakref.ref(self), self._stop, self.CLOCK_RESOLUTION),
+                         daemon=True).start()
+    
+    @staticmethod
+    def _tick(ref: "weakref.ref[LRUCache]", stop: threading.Event,
+              resolution: float) -> None:
+        """Refresh the cached clock until stopped or the cache is gone"""
+        while not stop.wait(resolution):
+            cache = ref()
+            if cache is None:
+                return
+            cache._now = time.monotonic()
+            del cache
+    
+    def close(self) -> None:
+        """Stop the clock thread"""
+        self._stop.set()
+    
+    @property
+    def current_size(self) -> int:
+        """Total bytes held across all shards"""
+        return sum(self._sizes)
+    
+    def _shard_index(self, url: str) -> int:
+        """Map a URL to its shard"""
+        return hash(url) & (self.NUM_SHARDS - 1)
         
     def get(self, url: str) -> Optional[CachedResponse]:
         """Get item from cache"""
-        with self.lock:
-            if url not in self.cache:
+        s = self._shard_index(url)
+        shard = self._shards[s]
+        with self._locks[s]:
+            response = shard.get(url)
+            if response is None:
                 return None
             
-            response = self.cache[url]
-            
             # Check expiration
-            if time.time() - response.timestamp > self.ttl:
-                self._remove(url)
+            if self._now - response.timestamp > self.ttl:
+                self._remove(s, url)
                 return None
             
-            # Move to end (mark as recently used)
-            self.cache.move_to_end(url)
+            # Count the hit instead of reordering entries on every read
+            counts = self._counts[s]
+            count = counts[url] + 1
+            counts[url] = count
+            if count > self.MAX_COUNT:
+                # Age all counters so old popularity decays
+                for key in counts:
+                    counts[key] >>= 1
             return response
 
     def put(self, url: str, status: int, headers: bytes, body: bytes) -> None:
         """Add item to cache"""
-        size = len(body) + len(headers)
+        headers, etag = _with_etag(headers, body)
+        size = len(headers) + len(body)
         
-        # Don't cache items larger than max size
-        if size > self.max_size:
+        # Don't cache items larger than a shard's budget
+        if size > self._shard_cap:
             return
 
-        with self.lock:
-            # If exists, update and move to end
-            if url in self.cache:
-                self._remove(url)
+        s = self._shard_index(url)
+        shard = self._shards[s]
+        with self._locks[s]:
+            # If exists, replace it
+            if url in shard:
+                self._remove(s, url)
             
-            # Evict old items if needed
-            while self.current_size + size > self.max_size and self.cache:
-                self.cache.popitem(last=False) # Remove first item (least recently used)
-                # Note: In a real implementation we'd track exact size of removed items
-                # For simplicity here, we rely on the loop
-                self.current_size -= 1024 # Approx reduction logic for safety
+            # Evict least used items if needed (ties go to the oldest entry)
+            counts = self._counts[s]
+            while self._sizes[s] + size > self._shard_cap and shard:
+                self._remove(s, min(counts, key=counts.get))
 
+            # Assemble the full response once so a hit is a single write
             response = CachedResponse(
                 status_code=status,
-                headers=headers,
-                body=body,
-                timestamp=time.time(),
-                original_url=url
+                wire=headers + body,
+                header_size=len(headers),
+                timestamp=self._now,
+                original_url=url,
+                etag=etag,
+                not_modified=b'HTTP/1.1 304 Not Modified\r\nETag: %s\r\n\r\n' % etag.encode('latin-1')
             )
             
-            self.cache[url] = response
-            self.current_size += size
+            shard[url] = response
+            counts[url] = 1
+            self._sizes[s] += size
+
+    def _remove(self, s: int, url: str):
+        """Internal remove (caller holds the shard lock)"""
+        entry = self._shards[s].pop(url, None)
+        if entry is not None:
+            del self._counts[s][url]
+            self._sizes[s] -= self._entry_size(entry)
 
-    def _remove(self, url: str):
-        """Internal remove"""
-        if url in self.cache:
-            entry = self.cache.pop(url)
-            self.current_size -= (len(entry.body) + len(entry.headers))
+    @staticmethod
+    def _entry_size(entry: CachedResponse) -> int:
+        """Bytes accounted against max_size for an entry"""
+        return len(entry.wire)
 
     def clear(self):
         """Clear cache"""
-        with self.lock:
-            self.cache.clear()
-            self.current_size = 0
+        for s, shard in enumerate(self._shards):
+            with self._locks[s]:
+                shard.clear()
+                self._counts[s].clear()
+                self._sizes[s] = 0
@@ -5,7 +5,9 @@ Handles domain/IP blacklist filtering and Authentication
 
 import ipaddress
 import base64
-from typing import Set, Tuple, Optional, Dict
+import hmac
+from pathlib import Path
+from typing import Set, Tuple, Optional, Dict, List
 
 
 class FilterManager:
@@ -15,8 +17,13 @@ class FilterManager:
         """Initialize filter manager"""
         self.blocked_domains: Set[str] = set()
         self.blocked_domain_suffixes: Set[str] = set()
+        # Reversed-label trie for wildcard rules: '*.ads.com' -> {'com': {'ads': {'$': 'ads.com'}}}
+        self._suffix_trie: dict = {}
         self.blocked_ips: Set[str] = set()
         self.blocked_ip_ranges: list = []
+        # Binary prefix tries for CIDR rules, children keyed by bit (0/1)
+        self._v4_trie: dict = {}
+        self._v6_trie: dict = {}
         
         if blacklist_file:
             self.load_blacklist(blacklist_file)
@@ -24,14 +31,28 @@ class FilterManager:
     def load_blacklist(self, blacklist_file: str) -> None:
         """Load blacklist from file"""
         try:
-            with open(blacklist_file, 'r') as f:
-                for line in f:
-                    # Remove comments and whitespace
-                    line = line.split('#')[0].strip()
-                    if not line:
-                        continue
-                    
-                    self._add_rule(line)
+            data = Path(blacklist_file).read_text()
+            
+            # Partition in one pass with cheap character tests; only rules
+            # that can be IPs or CIDR ranges go through ipaddress parsing
+            exact = []
+            wildcard = []
+            for line in data.splitlines():
+                # Remove comments and whitespace
+                rule = line.split('#', 1)[0].strip().lower()
+                if not rule:
+                    continue
+                
+                if rule.startswith('*.'):
+                    wildcard.append(rule[2:])
+                elif '/' in rule or ':' in rule or rule[0].isdigit():
+                    self._add_rule(rule)
+                else:
+                    exact.append(rule)
+            
+            self.blocked_domains.update(exact)
+            for suffix in wildcard:
+                self._add_suffix(suffix)
         except FileNotFoundError:
             print(f"Warning: Blacklist file not found: {blacklist_file}")
         except Exception as e:
@@ -47,6 +68,7 @@ class FilterManager:
             try:
                 network = ipaddress.ip_network(rule, strict=False)
                 self.blocked_ip_ranges.append(network)
+                self._add_range(network)
                 return
             except ValueError:
                 pass
@@ -62,38 +84,87 @@ class FilterManager:
         # Domain name
         if rule.startswith('*.'):
             # Wildcard domain (suffix match)
-            self.blocked_domain_suffixes.add(rule[2:])  # Remove '*.'
+            self._add_suffix(rule[2:])  # Remove '*.'
         else:
             # Exact domain match
             self.blocked_domains.add(rule)
     
+    def _add_suffix(self, suffix: str) -> None:
+        """Insert a wildcard suffix into the reversed-label trie"""
+        self.blocked_domain_suffixes.add(suffix)
+        node = self._suffix_trie
+        for label in reversed(suffix.split('.')):
+            node = node.setdefault(label, {})
+        node['$'] = suffix
+    
+    def _add_range(self, network) -> None:
+        """Insert a CIDR network into the matching prefix trie"""
+        if network.version == 4:
+            node, width = self._v4_trie, 32
+        else:
+            node, width = self._v6_trie, 128
+        
+        addr = int(network.network_address)
+        for i in range(network.prefixlen):
+            node = node.setdefault((addr >> (width - 1 - i)) & 1, {})
+        node['hit'] = str(network)
+    
+    @staticmethod
+    def _match_range(trie: dict, addr: int, width: int) -> Optional[str]:
+        """Longest-prefix match of an integer address against a prefix trie"""
+        node = trie
+        match = node.get('hit')
+        for i in range(width):
+            node = node.get((addr >> (width - 1 - i)) & 1)
+            if node is None:
+                break
+            if 'hit' in node:
+                match = node['hit']
+        return match
+    
     def is_blocked(self, host: str) -> Tuple[bool, str]:
         """Check if host is blocked"""
-        # Separate host and port
-        hostname = host.split(':')[0] if ':' in host else host
+        # Separate host and port: [IPv6]:port loses its brackets, while a
+        # bare IPv6 literal has several colons and no port to strip
+        if host.startswith('['):
+            end = host.find(']')
+            hostname = host[1:end] if end > 0 else host
+        else:
+            hostname = host.split(':')[0] if host.count(':') == 1 else host
         hostname = hostname.lower().strip()
         
         # Check exact IP match
         if hostname in self.blocked_ips:
             return True, f"IP {hostname} is blacklisted"
         
-        # Check CIDR ranges
-        try:
-            ip_obj = ipaddress.ip_address(hostname)
-            for cidr_range in self.blocked_ip_ranges:
-                if ip_obj in cidr_range:
+        # Check CIDR ranges, but only for hosts that can be IP literals:
+        # IPv6 has a ':', IPv4 is digits and dots. Ordinary domain names
+        # skip the ipaddress parse and its ValueError entirely.
+        if ':' in hostname or (hostname[:1].isdigit() and not hostname.strip('0123456789.')):
+            try:
+                ip_obj = ipaddress.ip_address(hostname)
+                if ip_obj.version == 4:
+                    cidr_range = self._match_range(self._v4_trie, int(ip_obj), 32)
+                else:
+                    cidr_range = self._match_range(self._v6_trie, int(ip_obj), 128)
+                if cidr_range:
                     return True, f"IP {hostname} is in blocked range {cidr_range}"
-        except ValueError:
-            pass  # Not an IP address
+            except ValueError:
+                pass  # Not an IP address
         
         # Check exact domain match
         if hostname in self.blocked_domains:
             return True, f"Domain {hostname} is blacklisted"
         
         # Check domain suffix match (*.example.com blocks sub.example.com)
-        for suffix in self.blocked_domain_suffixes:
-            if hostname == suffix or hostname.endswith('.' + suffix):
-                return True, f"Domain {hostname} matches blocked pattern *.{suffix}"
+        # Walk the trie from the TLD inwards; cost is bounded by label count
+        node = self._suffix_trie
+        for label in reversed(hostname.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            if '$' in node:
+                return True, f"Domain {hostname} matches blocked pattern *.{node['$']}"
         
         return False, "Not blocked"
 
@@ -108,6 +179,8 @@ class AuthenticationManager:
             credentials_file: Path to file with 'username:password' lines
         """
         self.users: Dict[str, str] = {}
+        # base64('user:pass') tokens, matched directly against the header
+        self._tokens: List[bytes] = []
         self.enabled = False
         
         if credentials_file:
@@ -126,6 +199,11 @@ class AuthenticationManager:
                             self.users[user.strip()] = pw.strip()
                             count += 1
                 
+                self._tokens = [
+                    base64.b64encode(f"{user}:{pw}".encode('utf-8'))
+                    for user, pw in self.users.items()
+                ]
+                
                 if count > 0:
                     self.enabled = True
                     print(f"[*] Loaded {count} users for authentication")
@@ -143,21 +221,10 @@ class AuthenticationManager:
         if not auth_header or not auth_header.startswith('Basic '):
             return False
             
-        try:
-            # Decode base64
-            encoded = auth_header.split(' ')[1]
-            decoded = base64.b64decode(encoded).decode('utf-8')
-            
-            if ':' not in decoded:
-                return False
-                
-            username, password = decoded.split(':', 1)
-            
-            # Check against loaded users
-            if username in self.users and self.users[username] == password:
-                return True
-                
-            return False
-            
-        except Exception:
-            return False
+        # Compare the encoded token against every known credential without
+        # decoding it; compare_digest keeps each check constant-time
+        token = auth_header[6:].strip().encode('utf-8')
+        valid = False
+        for expected in self._tokens:
+            valid |= hmac.compare_digest(token, expected)
+        return valid
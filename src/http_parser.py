@@ -3,77 +3,190 @@ HTTP Request/Response Parser Module
 Handles parsing of HTTP requests and responses
 """
 
-import re
+import sys
 from typing import Tuple, Optional, Dict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
+# One object per request: drop the per-instance __dict__ where supported
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+# Shared str objects for tokens that repeat on every request, looked up by
+# their raw bytes so the common case skips decode()/upper()/lower()
+_METHODS = {
+    m.encode(): m
+    for m in ('GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'CONNECT', 'OPTIONS', 'PATCH')
+}
+
+# Keyed by both canonical and lowercase spellings, values interned lowercase
+_COMMON_HEADERS = {
+    raw: sys.intern(name.lower())
+    for name in ('Host', 'User-Agent', 'Accept', 'Accept-Encoding', 'Accept-Language',
+                 'Connection', 'Proxy-Connection', 'Proxy-Authorization', 'Content-Length',
+                 'Content-Type', 'Cookie', 'Referer', 'Cache-Control',
+                 'Upgrade-Insecure-Requests')
+    for raw in (name.encode(), name.lower().encode())
+}
+
+
+def _split_authority(authority: str) -> Tuple[str, str]:
+    """Split host[:port] into (hostname, port); [IPv6] literals lose their brackets"""
+    if authority.startswith('['):
+        end = authority.find(']')
+        if end > 0:
+            rest = authority[end + 1:]
+            return authority[1:end], rest[1:] if rest.startswith(':') else ''
+    hostname, _, port = authority.partition(':')
+    return hostname, port
+
+
+def _peek_hostname(authority: bytes) -> bytes:
+    """Bytes counterpart of _split_authority that keeps only the hostname"""
+    if authority.startswith(b'['):
+        end = authority.find(b']')
+        if end > 0:
+            return authority[1:end]
+    return authority.split(b':', 1)[0]
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class HTTPRequest:
     """Represents a parsed HTTP request"""
     method: str
     target: str
     version: str
-    headers: Dict[str, str]
+    headers: Dict[str, str]  # keys are lowercase
     body: bytes = b''
     
+    # Derived from target once in __post_init__ so accessors stay O(1)
+    _uri_host: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _uri_hostname: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _port: int = field(default=80, init=False, repr=False, compare=False)
+    _upstream_target: str = field(default='', init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        """Split the request target into host, port and path in one pass"""
+        target = self.target
+        is_connect = self.method.upper() == 'CONNECT'
+        self._upstream_target = target
+        port = None
+        
+        if target.startswith(('http://', 'https://')):
+            # Absolute URI: scheme://authority[/path]
+            start = target.find('://') + 3
+            slash = target.find('/', start)
+            authority = target[start:] if slash < 0 else target[start:slash]
+            if not is_connect:
+                # Convert to relative path for upstream
+                self._upstream_target = target[slash:] if authority and slash >= 0 else '/'
+            
+            if authority:
+                self._uri_host = authority
+                hostname, port_str = _split_authority(authority)
+                self._uri_hostname = hostname
+                if hostname:
+                    # Explicit port: leading digits after the host's ':'
+                    digits = len(port_str) - len(port_str.lstrip('0123456789'))
+                    if digits:
+                        port = int(port_str[:digits])
+        
+        if port is None:
+            if is_connect:
+                # CONNECT host:port format
+                port = 443
+                if ':' in target:
+                    # A bracketed IPv6 literal keeps its own colons inside []
+                    port_str = (_split_authority(target)[1] if target.startswith('[')
+                                else target.split(':')[1])
+                    try:
+                        port = int(port_str)
+                    except ValueError:
+                        pass
+            elif target.startswith('https://'):
+                # Default HTTP/HTTPS ports
+                port = 443
+            else:
+                port = 80
+        self._port = port
+    
     @property
     def host(self) -> Optional[str]:
         """Extract host from request"""
         # First try to get from absolute URI
-        if self.target.startswith('http://') or self.target.startswith('https://'):
-            match = re.match(r'https?://([^/]+)', self.target)
-            if match:
-                return match.group(1)
+        if self._uri_host:
+            return self._uri_host
         
         # Fall back to Host header
-        return self.headers.get('host') or self.headers.get('Host')
+        return self.headers.get('host')
     
     @property
     def port(self) -> int:
         """Extract port from request"""
-        # Check if port is in target (for absolute URIs)
-        if self.target.startswith('http://') or self.target.startswith('https://'):
-            match = re.match(r'https?://([^/:]+):(\d+)', self.target)
-            if match:
-                return int(match.group(2))
-        
-        # Default based on method
-        if self.method.upper() == 'CONNECT':
-            # CONNECT host:port format
-            if ':' in self.target:
-                try:
-                    return int(self.target.split(':')[1])
-                except (ValueError, IndexError):
-                    return 443
-            return 443
-        
-        # Default HTTP/HTTPS ports
-        if self.target.startswith('https://'):
-            return 443
-        return 80
+        return self._port
     
     @property
     def hostname(self) -> Optional[str]:
         """Extract hostname without port"""
+        if self._uri_host:
+            return self._uri_hostname
         host = self.host
         if not host:
             return None
-        # Remove port if present
-        return host.split(':')[0] if ':' in host else host
+        # Remove port (and IPv6 brackets) if present
+        return _split_authority(host)[0]
     
     def get_target_for_upstream(self) -> str:
         """Get target suitable for upstream server (relative path)"""
-        if self.method.upper() == 'CONNECT':
-            return self.target
-        
-        # If absolute URI, convert to relative path
-        if self.target.startswith('http://') or self.target.startswith('https://'):
-            match = re.match(r'https?://[^/]+(/.*)', self.target)
-            if match:
-                return match.group(1)
-            return '/'
-        return self.target
+        return self._upstream_target
+
+
+_STATUS_REASONS = {
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    502: 'Bad Gateway',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout',
+}
+
+
+_ERROR_BODY_TEMPLATE = b'''<!DOCTYPE html>
+<html>
+<head>
+    <title>%d %s</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 40px; }
+        h1 { color: #333; }
+        p { color: #666; }
+    </style>
+</head>
+<body>
+    <h1>%d %s</h1>
+    <p>The proxy server encountered an error processing your request.</p>
+</body>
+</html>'''
+
+_ERROR_HEAD_TEMPLATE = (
+    b"HTTP/1.1 %d %s\r\n"
+    b"Content-Type: text/html\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+
+def _render_error_response(status_code: int, reason: str) -> bytes:
+    """Render a complete HTML error response"""
+    reason_bytes = reason.encode()
+    html_body = _ERROR_BODY_TEMPLATE % (status_code, reason_bytes, status_code, reason_bytes)
+    
+    return _ERROR_HEAD_TEMPLATE % (status_code, reason_bytes, len(html_body)) + html_body
+
+
+# Error pages never change at runtime, so render the standard ones at import
+_ERROR_RESPONSES = {
+    code: _render_error_response(code, reason)
+    for code, reason in _STATUS_REASONS.items()
+}
 
 
 class HTTPParser:
@@ -83,57 +196,156 @@ class HTTPParser:
     MAX_LINE_SIZE = 4096    # 4KB max line size
     
     @staticmethod
-    async def parse_request(reader) -> Tuple[Optional[HTTPRequest], bytes]:
+    async def read_head(reader) -> Tuple[Optional[bytes], bytes]:
+        """
+        Read a request head from asyncio StreamReader
+        
+        Returns:
+            Tuple of (head, remaining_data); head excludes the blank line and
+            is None on EOF or when it exceeds MAX_HEADER_SIZE
+        """
+        # Read until header terminator, capped at MAX_HEADER_SIZE; each
+        # pass only scans the newly received bytes for the separator
+        buf = bytearray()
+        search_from = 0
+        try:
+            while True:
+                chunk = await reader.read(HTTPParser.MAX_HEADER_SIZE - len(buf))
+                if not chunk:
+                    return None, b''  # EOF or header block too large
+                buf += chunk
+                sep = buf.find(b'\r\n\r\n', search_from)
+                if sep >= 0:
+                    return bytes(buf[:sep]), bytes(buf[sep + 4:])
+                search_from = max(0, len(buf) - 3)
+        except Exception:
+            return None, b''
+    
+    @staticmethod
+    def split_request_line(head: bytes) -> Optional[Tuple[str, str, str]]:
+        """Split the first line of a raw request head into (method, target, version)"""
+        end = head.find(b'\r\n')
+        # Split on bytes and decode only the fields we keep
+        parts = (head if end < 0 else head[:end]).split()
+        
+        if len(parts) < 2:
+            return None
+        
+        method = _METHODS.get(parts[0]) or parts[0].decode('utf-8', errors='ignore').upper()
+        target = parts[1].decode('utf-8', errors='ignore')
+        version = parts[2].decode('utf-8', errors='ignore') if len(parts) > 2 else 'HTTP/1.1'
+        return method, target, version
+    
+    @staticmethod
+    def peek_host(head: bytes) -> Optional[bytes]:
+        """
+        Find the target hostname in a raw request head without parsing it
+        
+        Follows HTTPRequest.hostname: the authority of an absolute-URI
+        target, else the Host header, with any port removed. Returns None
+        when neither is found.
+        """
+        line_end = head.find(b'\r\n')
+        if line_end < 0:
+            line_end = len(head)
+        
+        # Absolute URI: scheme://authority[/path]
+        target = head.find(b' ', 0, line_end) + 1
+        if target and (head.startswith(b'http://', target) or head.startswith(b'https://', target)):
+            start = head.find(b'://', target) + 3
+            stop = head.find(b' ', start, line_end)
+            if stop < 0:
+                stop = line_end
+            slash = head.find(b'/', start, stop)
+            authority = head[start:stop if slash < 0 else slash]
+            if authority:
+                return _peek_hostname(authority)
+        
+        # Fall back to Host header; the last one wins, as in parse_request's
+        # header dict, so only the text after the last 'Host:' is lowercased
+        pos = head.rfind(b'\r\nHost:')
+        later = head[pos + 1:].lower().rfind(b'\r\nhost:')
+        if later >= 0:
+            pos += 1 + later
+        elif pos < 0:
+            return None
+        pos += 7
+        end = head.find(b'\r\n', pos)
+        value = (head[pos:] if end < 0 else head[pos:end]).strip()
+        return _peek_hostname(value) or None
+    
+    @staticmethod
+    async def parse_request(reader, head: Optional[bytes] = None,
+                            rest: bytes = b'') -> Tuple[Optional[HTTPRequest], bytes]:
         """
         Parse HTTP request from asyncio StreamReader
         
+        head and rest may carry a request head already taken with
+        read_head(); otherwise it is read from reader first.
+        
         Returns:
-            Tuple of (HTTPRequest, remaining_data)
+            Tuple of (HTTPRequest, remaining_data), where remaining_data is
+            anything read past the end of the request (e.g. tunnel payload)
         """
         try:
-            # Read until header terminator
-            raw_request = await reader.readuntil(b'\r\n\r\n')
-            header_data = raw_request[:-4]  # Remove \r\n\r\n
-            
-            lines = header_data.split(b'\r\n')
-            if not lines:
-                return None, b''
+            if head is None:
+                head, rest = await HTTPParser.read_head(reader)
+                if head is None:
+                    return None, b''
+            header_data = head
             
             # Parse request line
-            request_line = lines[0].decode('utf-8', errors='ignore').strip()
-            parts = request_line.split()
-            
-            if len(parts) < 2:
+            request_line = HTTPParser.split_request_line(header_data)
+            if request_line is None:
                 return None, b''
+            method, target, version = request_line
             
-            method = parts[0].upper()
-            target = parts[1]
-            version = parts[2] if len(parts) > 2 else 'HTTP/1.1'
+            data_len = len(header_data)
+            end = header_data.find(b'\r\n')
+            if end < 0:
+                end = data_len
             
-            # Parse headers
+            # Parse headers, scanning the buffer line by line in place
             headers = {}
-            for line in lines[1:]:
-                if not line:
-                    break
-                header_str = line.decode('utf-8', errors='ignore')
-                if ':' in header_str:
-                    key, value = header_str.split(':', 1)
-                    headers[key.strip()] = value.strip()
+            pos = end + 2
+            while pos < data_len:
+                end = header_data.find(b'\r\n', pos)
+                if end < 0:
+                    end = data_len
+                colon = header_data.find(b':', pos, end)
+                if colon > pos:
+                    raw_key = header_data[pos:colon]
+                    key = _COMMON_HEADERS.get(raw_key)
+                    if key is None and raw_key.strip() != raw_key:
+                        # No whitespace is allowed around a field name
+                        # (RFC 9112 5.1); such lines are not headers, which
+                        # keeps peek_host's exact 'Host:' match in agreement
+                        pos = end + 2
+                        continue
+                    if key is None:
+                        # Header names are case-insensitive ASCII tokens:
+                        # normalize on bytes, then decode only once
+                        raw_key = raw_key.lower()
+                        key = _COMMON_HEADERS.get(raw_key)
+                        if key is None:
+                            # Not interned: names come from the client, and
+                            # interned strings are never freed on 3.12+
+                            key = raw_key.decode('utf-8', errors='ignore')
+                    value = header_data[colon + 1:end].strip()
+                    headers[key] = value.decode('utf-8', errors='ignore')
+                pos = end + 2
             
             # Get Content-Length if present
-            content_length = 0
-            for key in headers:
-                if key.lower() == 'content-length':
-                    try:
-                        content_length = int(headers[key])
-                    except ValueError:
-                        pass
-                    break
+            cl = headers.get('content-length')
+            content_length = int(cl) if cl and cl.isdigit() else 0
             
-            # Read body if present
+            # Read body if present, starting with bytes already buffered
             body = b''
             if content_length > 0:
-                body = await reader.readexactly(content_length)
+                body = rest[:content_length]
+                rest = rest[content_length:]
+                if len(body) < content_length:
+                    body += await reader.readexactly(content_length - len(body))
             
             request = HTTPRequest(
                 method=method,
@@ -143,7 +355,7 @@ class HTTPParser:
                 body=body
             )
             
-            return request, b''
+            return request, rest
             
         except Exception as e:
             return None, b''
@@ -151,56 +363,77 @@ class HTTPParser:
     @staticmethod
     def format_request(request: HTTPRequest) -> bytes:
         """Format HTTPRequest back to bytes for sending to upstream server"""
+        head, body = HTTPParser.format_request_parts(request)
+        return head + body
+    
+    @staticmethod
+    def format_request_parts(request: HTTPRequest) -> Tuple[bytes, bytes]:
+        """
+        Format HTTPRequest as (head, body) for a vectored write upstream
+        
+        head holds the request line and headers including the terminating
+        blank line; body is passed through without being copied.
+        """
         # Use relative target for upstream
         target = request.get_target_for_upstream()
         
-        # Build request line
-        request_line = f"{request.method} {target} {request.version}\r\n"
+        # Request line and headers, each encoded once
+        parts = [f"{request.method} {target} {request.version}".encode()]
+        parts.extend(f"{key}: {value}".encode() for key, value in request.headers.items())
+        
+        # Blank line terminates the headers
+        parts.append(b'')
+        parts.append(b'')
+        return b'\r\n'.join(parts), request.body
+    
+    @staticmethod
+    def response_framing(head: bytes, method: str) -> Tuple[Optional[int], bool]:
+        """
+        Work out where an upstream response ends
+        
+        Returns (body_length, keep_alive) for a complete response head.
+        body_length is None when the body runs until the connection closes
+        (or is chunked); such connections are never reported as reusable.
+        """
+        line_end = head.find(b'\r\n')
+        parts = head[:line_end].split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            return None, False
+        version, status = parts[0], int(parts[1])
         
-        # Build headers
-        header_lines = request_line
-        for key, value in request.headers.items():
-            header_lines += f"{key}: {value}\r\n"
+        fields = {}
+        for line in head[line_end + 2:].split(b'\r\n'):
+            name, sep, value = line.partition(b':')
+            if sep:
+                fields[name.strip().lower()] = value.strip().lower()
         
-        header_lines += "\r\n"
+        connection = fields.get(b'connection', b'')
+        if version == b'HTTP/1.1':
+            keep_alive = b'close' not in connection
+        else:
+            keep_alive = b'keep-alive' in connection
         
-        # Combine headers and body
-        return header_lines.encode() + request.body
+        # Interim and upgrade responses are relayed until close as before
+        if status < 200:
+            return None, False
+        # Bodyless by definition, but a broken origin may still send one
+        # after the head; such a connection is never handed to a new request
+        if method == 'HEAD' or status in (204, 304):
+            return 0, False
+        if b'transfer-encoding' in fields:
+            return None, False
+        length = fields.get(b'content-length')
+        if length is not None and length.isdigit():
+            return int(length), keep_alive
+        return None, False
     
     @staticmethod
     def format_error_response(status_code: int, reason: str = '') -> bytes:
         """Format HTTP error response"""
-        status_map = {
-            400: 'Bad Request',
-            403: 'Forbidden',
-            404: 'Not Found',
-            502: 'Bad Gateway',
-            503: 'Service Unavailable',
-            504: 'Gateway Timeout',
-        }
-        
-        reason = reason or status_map.get(status_code, 'Error')
-        
-        html_body = f'''<!DOCTYPE html>
-<html>
-<head>
-    <title>{status_code} {reason}</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 40px; }}
-        h1 {{ color: #333; }}
-        p {{ color: #666; }}
-    </style>
-</head>
-<body>
-    <h1>{status_code} {reason}</h1>
-    <p>The proxy server encountered an error processing your request.</p>
-</body>
-</html>'''
-        
-        response = f"HTTP/1.1 {status_code} {reason}\r\n"
-        response += f"Content-Type: text/html\r\n"
-        response += f"Content-Length: {len(html_body)}\r\n"
-        response += f"Connection: close\r\n"
-        response += f"\r\n"
+        # Standard reasons are served from the pre-rendered table
+        cached = _ERROR_RESPONSES.get(status_code)
+        if cached is not None and (not reason or reason == _STATUS_REASONS[status_code]):
+            return cached
         
-        return response.encode() + html_body.encode()
+        reason = reason or _STATUS_REASONS.get(status_code, 'Error')
+        return _render_error_response(status_code, reason)
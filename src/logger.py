@@ -3,9 +3,13 @@ Logging Module
 Handles proxy access logging and event tracking
 """
 
+import array
+import atexit
 import logging
 import logging.handlers
+import queue
 from pathlib import Path
+from typing import Tuple
 
 
 class ProxyLogger:
@@ -17,6 +21,14 @@ class ProxyLogger:
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
         
+        # Background listeners that perform the actual file writes; their
+        # threads are daemons, so flush them at exit if close() wasn't called
+        self._listeners = []
+        # (logger, QueueHandler) pairs this instance attached; the loggers
+        # are process-wide, so close() has to detach them again
+        self._handlers = []
+        atexit.register(self.close)
+        
         # Create loggers for different aspects
         self.access_logger = self._setup_logger('access', 'access.log', 
                                                max_bytes, backup_count)
@@ -33,7 +45,12 @@ class ProxyLogger:
     
     def _setup_logger(self, name: str, filename: str, 
                       max_bytes: int, backup_count: int) -> logging.Logger:
-        """Setup individual logger with rotation"""
+        """
+        Setup individual logger with rotation
+        
+        The logger only enqueues records; a QueueListener thread writes
+        them to the rotating file so request handlers never block on I/O.
+        """
         logger = logging.getLogger(name)
         
         # File handler with rotation
@@ -51,30 +68,57 @@ class ProxyLogger:
         )
         handler.setFormatter(formatter)
         
-        logger.addHandler(handler)
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.start()
+        self._listeners.append(listener)
+        
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        logger.addHandler(queue_handler)
         logger.propagate = False
+        self._handlers.append((logger, queue_handler))
         
         return logger
     
+    def close(self) -> None:
+        """Detach from the loggers, flush queued records and stop the writer threads"""
+        # Detach first so nothing is queued once the listeners are gone
+        for logger, queue_handler in self._handlers:
+            logger.removeHandler(queue_handler)
+        self._handlers.clear()
+        for listener in self._listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        self._listeners.clear()
+        atexit.unregister(self.close)
+    
     def log_request_allowed(self, client_addr: str, client_port: int, 
                            target_host: str, target_port: int,
-                           request_line: str, status_code: int = 0,
-                           bytes_sent: int = 0, bytes_received: int = 0) -> None:
-        """Log an allowed request"""
+                           request_line: Tuple[str, str, str], status_code: int = 0,
+                           bytes_sent: int = 0, bytes_received: int = 0,
+                           cached: bool = False) -> None:
+        """
+        Log an allowed request
+        
+        request_line is (method, target, version); it is only joined
+        into text when the record is actually emitted.
+        """
         status_str = f"HTTP {status_code}" if status_code else "PENDING"
         self.access_logger.info(
-            f"ALLOWED | {client_addr}:{client_port} -> {target_host}:{target_port} | "
-            f"{request_line} | {status_str} | "
-            f"Sent: {bytes_sent} | Received: {bytes_received}"
+            "ALLOWED | %s:%s -> %s:%s | %s %s %s%s | %s | Sent: %s | Received: %s",
+            client_addr, client_port, target_host, target_port,
+            *request_line, " [CACHE]" if cached else "",
+            status_str, bytes_sent, bytes_received
         )
     
     def log_request_blocked(self, client_addr: str, client_port: int,
-                           target_host: str, request_line: str,
+                           target_host: str, request_line: Tuple[str, str, str],
                            reason: str) -> None:
         """Log a blocked request"""
         self.access_logger.info(
-            f"BLOCKED | {client_addr}:{client_port} -> {target_host} | "
-            f"{request_line} | Reason: {reason}"
+            "BLOCKED | %s:%s -> %s | %s %s %s | Reason: %s",
+            client_addr, client_port, target_host, *request_line, reason
         )
     
     def log_error(self, error_type: str, client_addr: str = '',
@@ -92,62 +136,68 @@ class ProxyLogger:
     
     def log_debug(self, event: str, **kwargs) -> None:
         """Log debug information"""
+        if not self.debug_logger.isEnabledFor(logging.DEBUG):
+            return
         details = ' | '.join(f"{k}={v}" for k, v in kwargs.items())
         if details:
-            self.debug_logger.debug(f"{event} | {details}")
+            self.debug_logger.debug("%s | %s", event, details)
         else:
             self.debug_logger.debug(event)
     
     def log_server_start(self, host: str, port: int) -> None:
         """Log server startup"""
-        self.access_logger.info(f"SERVER_START | Listening on {host}:{port}")
+        self.access_logger.info("SERVER_START | Listening on %s:%s", host, port)
     
     def log_server_stop(self) -> None:
         """Log server shutdown"""
         self.access_logger.info("SERVER_STOP | Server shutting down")
 
 
+# Counter slots in ConnectionTracker._counters
+_ACTIVE, _TOTAL, _SENT, _RECV, _BLOCKED, _ALLOWED = range(6)
+
+
 class ConnectionTracker:
     """Tracks active connections for metrics"""
     
     def __init__(self):
-        self.active_connections = 0
-        self.total_connections = 0
-        self.total_bytes_sent = 0
-        self.total_bytes_received = 0
-        self.blocked_requests = 0
-        self.allowed_requests = 0
+        # One flat array of unsigned machine ints instead of six boxed int
+        # attributes; plain += under the GIL, so no lock is needed
+        self._counters = array.array('Q', [0] * 6)
     
     def record_connection_start(self) -> None:
         """Record a new connection"""
-        self.active_connections += 1
-        self.total_connections += 1
+        counters = self._counters
+        counters[_ACTIVE] += 1
+        counters[_TOTAL] += 1
     
     def record_connection_end(self) -> None:
         """Record connection end"""
-        if self.active_connections > 0:
-            self.active_connections -= 1
+        if self._counters[_ACTIVE] > 0:
+            self._counters[_ACTIVE] -= 1
     
     def record_allowed_request(self, bytes_sent: int = 0, 
                               bytes_received: int = 0) -> None:
         """Record allowed request"""
-        self.allowed_requests += 1
-        self.total_bytes_sent += bytes_sent
-        self.total_bytes_received += bytes_received
+        counters = self._counters
+        counters[_ALLOWED] += 1
+        counters[_SENT] += bytes_sent
+        counters[_RECV] += bytes_received
     
     def record_blocked_request(self) -> None:
         """Record blocked request"""
-        self.blocked_requests += 1
+        self._counters[_BLOCKED] += 1
     
     def get_stats(self) -> dict:
         """Get current statistics"""
+        counters = self._counters
         return {
-            'active_connections': self.active_connections,
-            'total_connections': self.total_connections,
-            'allowed_requests': self.allowed_requests,
-            'blocked_requests': self.blocked_requests,
-            'total_bytes_sent': self.total_bytes_sent,
-            'total_bytes_received': self.total_bytes_received,
+            'active_connections': counters[_ACTIVE],
+            'total_connections': counters[_TOTAL],
+            'allowed_requests': counters[_ALLOWED],
+            'blocked_requests': counters[_BLOCKED],
+            'total_bytes_sent': counters[_SENT],
+            'total_bytes_received': counters[_RECV],
         }
     
     def get_formatted_stats(self) -> str:
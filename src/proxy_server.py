@@ -4,8 +4,12 @@ Main proxy server with async I/O, Caching, and Authentication
 """
 
 import asyncio
+import functools
+import os
+import socket
 import sys
-from typing import Optional
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Set, Tuple
 
 # Import our modules
 from http_parser import HTTPParser, HTTPRequest
@@ -14,6 +18,48 @@ from logger import ProxyLogger, ConnectionTracker
 from cache import LRUCache
 
 
+# Relay tuning: read size per chunk, and the transport buffer level above
+# which we wait for the peer (asyncio's default high-water mark)
+READ_CHUNK_SIZE = 64 * 1024
+WRITE_HIGH_WATER = 64 * 1024
+
+# Longest wait for a closed transport to flush before it is aborted
+CLOSE_TIMEOUT = 5.0
+
+# How long a client turned away at capacity gets to send its request head;
+# reading it first lets the 503 arrive instead of a reset
+OVERLOAD_READ_TIMEOUT = 1.0
+
+# CONNECT tunnels between plain sockets are relayed in-kernel with splice(2)
+SPLICE_AVAILABLE = sys.platform.startswith('linux') and hasattr(os, 'splice')
+SPLICE_CHUNK_SIZE = 1 << 20  # Upper bound per call; the pipe size caps it
+
+# Idle keep-alive upstream connections, per (host, port) and overall
+POOL_MAX_PER_HOST = 8
+POOL_MAX_TOTAL = 256
+POOL_IDLE_TIMEOUT = 30.0  # Seconds an idle connection is kept
+# HEAD is left out: its responses are never reported as reusable
+POOLABLE_METHODS = frozenset(('GET',))
+
+# Larger responses stream straight through without being buffered for the cache
+CACHE_MAX_BYTES = 512 * 1024
+# Status lines of cacheable responses; matched at the start of the response only
+_CACHEABLE_STATUS = (b"HTTP/1.1 200 ", b"HTTP/1.0 200 ")
+
+# Static responses, built once at import
+_RESP_403 = HTTPParser.format_error_response(403, 'Forbidden')
+_RESP_503 = HTTPParser.format_error_response(503, 'Service Unavailable')
+_RESP_502 = HTTPParser.format_error_response(502, 'Bad Gateway')
+_RESP_502_TUNNEL = b"HTTP/1.1 502 Bad Gateway\r\n\r\n"
+_CONNECT_200 = b"HTTP/1.1 200 Connection Established\r\n\r\n"
+_RESP_407 = (
+    b"HTTP/1.1 407 Proxy Authentication Required\r\n"
+    b"Proxy-Authenticate: Basic realm=\"Proxy Server\"\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+
 class ProxyServer:
     """Main proxy server implementation"""
     
@@ -35,6 +81,11 @@ class ProxyServer:
         self.logger = ProxyLogger(log_dir=log_dir)
         self.tracker = ConnectionTracker()
         
+        # Per-instance memos for the per-request checks; auth is keyed on
+        # the raw header value. Cleared by reload_rules().
+        self._is_blocked = functools.lru_cache(maxsize=4096)(self.filter_manager.is_blocked)
+        self._validate_auth = functools.lru_cache(maxsize=1024)(self.auth_manager.validate)
+        
         # Initialize Cache
         self.cache_enabled = cache_enabled
         self.cache = LRUCache() if cache_enabled else None
@@ -44,6 +95,15 @@ class ProxyServer:
         # Server state
         self.server = None
         self.running = True
+        # Bounds concurrent clients; created by the first handle_client()
+        # call so it binds to the serving loop
+        self._conn_sem = None
+        # Pending wait_closed() tasks, kept referenced until they finish
+        self._closers: Set[asyncio.Task] = set()
+        # Idle upstream connections by (host, port), least recently used first;
+        # each entry carries the task that evicts it when it goes stale
+        self._upstream_pool: "OrderedDict[Tuple[str, int], Deque[Tuple[asyncio.StreamReader, asyncio.StreamWriter, asyncio.Future]]]" = OrderedDict()
+        self._pooled = 0
     
     async def start(self) -> None:
         """Start the proxy server"""
@@ -60,19 +120,80 @@ class ProxyServer:
         async with self.server:
             await self.server.serve_forever()
     
+    def reload_rules(self, blacklist_file: Optional[str] = None,
+                     auth_file: Optional[str] = None) -> None:
+        """Load additional blacklist rules or credentials and drop memoized results"""
+        if blacklist_file:
+            self.filter_manager.load_blacklist(blacklist_file)
+        if auth_file:
+            self.auth_manager.load_credentials(auth_file)
+        self._is_blocked.cache_clear()
+        self._validate_auth.cache_clear()
+    
     async def handle_client(self, reader: asyncio.StreamReader,
                            writer: asyncio.StreamWriter) -> None:
-        """Handle incoming client connection"""
+        """Handle incoming client connection, up to max_connections at once"""
+        if self._conn_sem is None:
+            self._conn_sem = asyncio.Semaphore(self.max_connections)
+        if self._conn_sem.locked():
+            # At capacity: fail fast rather than queue idle sockets
+            self.logger.log_error('OVERLOADED', details='max_connections reached')
+            try:
+                await asyncio.wait_for(HTTPParser.read_head(reader),
+                                       timeout=OVERLOAD_READ_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                writer.write(_RESP_503)
+                await writer.drain()
+            except Exception:
+                pass
+            self._close_in_background(writer)
+            return
+        
+        async with self._conn_sem:
+            await self._serve_client(reader, writer)
+    
+    async def _serve_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """Serve a single client connection"""
         client_addr = writer.get_extra_info('peername')
         client_ip, client_port = client_addr if client_addr else ('unknown', 0)
         
         self.tracker.record_connection_start()
         
         try:
+            # Read the request head
+            try:
+                head, initial_data = await asyncio.wait_for(
+                    HTTPParser.read_head(reader),
+                    timeout=self.timeout
+                )
+                if head is None:
+                    return # Silent close for invalid/empty
+            except asyncio.TimeoutError:
+                self.logger.log_error('TIMEOUT', client_ip, details='Request parsing timeout')
+                return
+            
+            # Cheap blacklist reject straight from the raw head, before the
+            # full parse; with authentication on, the 407 has to come first
+            if not self.auth_manager.enabled:
+                peeked = HTTPParser.peek_host(head)
+                if peeked:
+                    target_host = peeked.decode('utf-8', errors='ignore')
+                    is_blocked, reason = self._is_blocked(target_host)
+                    if is_blocked:
+                        request_line = HTTPParser.split_request_line(head)
+                        if request_line is None:
+                            return
+                        await self._reject_blocked(writer, client_ip, client_port,
+                                                   target_host, request_line, reason)
+                        return
+            
             # Parse HTTP request
             try:
                 request = await asyncio.wait_for(
-                    HTTPParser.parse_request(reader),
+                    HTTPParser.parse_request(reader, head, initial_data),
                     timeout=self.timeout
                 )
                 
@@ -80,7 +201,7 @@ class ProxyServer:
                     # Invalid request
                     return # Silent close for invalid/empty
                 
-                request_obj, _ = request # Unpack tuple
+                request_obj, initial_data = request # Unpack tuple
                 request = request_obj    # Use the object
                 
             except asyncio.TimeoutError:
@@ -90,19 +211,16 @@ class ProxyServer:
                 self.logger.log_error('PARSE_ERROR', client_ip, details=str(e))
                 return
             
+            # Request line for the access log, joined only when a record is emitted
+            request_line = (request.method, request.target, request.version)
+            
             # --- AUTHENTICATION CHECK ---
-            auth_header = request.headers.get('Proxy-Authorization')
-            if not self.auth_manager.validate(auth_header):
+            auth_header = request.headers.get('proxy-authorization')
+            if not self._validate_auth(auth_header):
                 # Return 407 Proxy Authentication Required
-                response = (
-                    "HTTP/1.1 407 Proxy Authentication Required\r\n"
-                    "Proxy-Authenticate: Basic realm=\"Proxy Server\"\r\n"
-                    "Content-Length: 0\r\n"
-                    "Connection: close\r\n\r\n"
-                ).encode()
-                writer.write(response)
+                writer.write(_RESP_407)
                 await writer.drain()
-                self.logger.log_request_blocked(client_ip, client_port, "AUTH", "AUTH", "Authentication Failed")
+                self.logger.log_request_blocked(client_ip, client_port, "AUTH", request_line, "Authentication Failed")
                 return
 
             # Extract target information
@@ -112,27 +230,19 @@ class ProxyServer:
             if not target_host:
                 return
             
-            # Log request details
-            request_line = f"{request.method} {request.target} {request.version}"
-            
             # Check filtering rules
-            is_blocked, reason = self.filter_manager.is_blocked(target_host)
+            is_blocked, reason = self._is_blocked(target_host)
             
             if is_blocked:
-                response = HTTPParser.format_error_response(403, 'Forbidden')
-                writer.write(response)
-                await writer.drain()
-                self.logger.log_request_blocked(
-                    client_ip, client_port, target_host, request_line, reason
-                )
-                self.tracker.record_blocked_request()
+                await self._reject_blocked(writer, client_ip, client_port,
+                                           target_host, request_line, reason)
                 return
             
             # Handle CONNECT method (HTTPS tunneling)
             if request.method.upper() == 'CONNECT':
                 await self.handle_connect_tunnel(
                     reader, writer, target_host, target_port,
-                    client_ip, client_port, request_line
+                    client_ip, client_port, request_line, initial_data
                 )
             else:
                 # Handle regular HTTP request
@@ -142,20 +252,50 @@ class ProxyServer:
                 )
             
         finally:
-            try:
-                writer.close()
-                await writer.wait_closed()
-            except Exception:
-                pass
-            
             self.tracker.record_connection_end()
+            
+            # Don't hold the handler (and its connection slot) for the
+            # peer's FIN round-trip; finish closing in the background
+            self._close_in_background(writer)
+    
+    def _close_in_background(self, writer: asyncio.StreamWriter) -> None:
+        """Close a client writer and let a task wait for the transport"""
+        try:
+            writer.close()
+        except Exception:
+            pass
+        closer = asyncio.create_task(self._wait_closed(writer))
+        self._closers.add(closer)
+        closer.add_done_callback(self._closers.discard)
+    
+    @staticmethod
+    async def _wait_closed(writer: asyncio.StreamWriter) -> None:
+        """Wait for a closed writer's transport to finish, ignoring errors"""
+        try:
+            await asyncio.wait_for(writer.wait_closed(), timeout=CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Buffered data never drained; drop the connection outright
+            writer.transport.abort()
+        except Exception:
+            pass
+    
+    async def _reject_blocked(self, writer: asyncio.StreamWriter,
+                              client_ip: str, client_port: int, target_host: str,
+                              request_line: Tuple[str, str, str], reason: str) -> None:
+        """Answer a blacklisted request with 403 and record it"""
+        writer.write(_RESP_403)
+        await writer.drain()
+        self.logger.log_request_blocked(
+            client_ip, client_port, target_host, request_line, reason
+        )
+        self.tracker.record_blocked_request()
     
     async def handle_http_request(self, reader: asyncio.StreamReader,
                                  client_writer: asyncio.StreamWriter,
                                  request: HTTPRequest,
                                  target_host: str, target_port: int,
                                  client_ip: str, client_port: int,
-                                 request_line: str) -> None:
+                                 request_line: Tuple[str, str, str]) -> None:
         """Handle regular HTTP request"""
         
         # --- CACHE CHECK (GET only) ---
@@ -163,101 +303,283 @@ class ProxyServer:
             cached_resp = self.cache.get(request.target)
             if cached_resp:
                 self.logger.log_debug("CACHE_HIT", url=request.target)
-                # Reconstruct response
-                header_data = cached_resp.headers
-                body_data = cached_resp.body
                 
-                # Send back to client
-                client_writer.write(header_data + body_data)
+                # Client already holds this version: answer 304 without a body
+                if_none_match = request.headers.get('if-none-match')
+                if if_none_match and cached_resp.etag_matches(if_none_match):
+                    response = cached_resp.not_modified
+                    status_code = 304
+                else:
+                    # Send the pre-assembled response back to client
+                    response = cached_resp.wire
+                    status_code = cached_resp.status_code
+                
+                client_writer.write(response)
                 await client_writer.drain()
                 
                 self.logger.log_request_allowed(
                     client_ip, client_port, target_host, target_port,
-                    request_line + " [CACHE]", status_code=cached_resp.status_code, 
-                    bytes_sent=len(body_data)
+                    request_line, status_code=status_code, 
+                    bytes_sent=len(response), cached=True
                 )
                 return
 
         try:
-            # Connect to upstream server
+            # Connect to upstream server, reusing an idle connection if possible.
+            # A body the parser did not read (chunked, or a Content-Length that
+            # is not plain digits) is never forwarded, so the origin could take
+            # the next pooled request as that body: such requests get their own
+            # connection.
+            headers = request.headers
+            reusable = (request.method in POOLABLE_METHODS
+                        and 'transfer-encoding' not in headers
+                        and headers.get('content-length', '0').isdigit())
             try:
-                server_reader, server_writer = await asyncio.wait_for(
-                    asyncio.open_connection(target_host, target_port),
-                    timeout=self.timeout
+                server_reader, server_writer, reused = await self._acquire_upstream(
+                    target_host, target_port, reusable
                 )
             except Exception as e:
-                response = HTTPParser.format_error_response(502, 'Bad Gateway')
-                client_writer.write(response)
+                client_writer.write(_RESP_502)
                 await client_writer.drain()
                 return
             
+            release = False
             try:
-                # Format and send request to upstream
-                formatted_request = HTTPParser.format_request(request)
-                server_writer.write(formatted_request)
-                await server_writer.drain()
-                
-                # Relay response back to client & Capture for Cache
-                response_buffer = b""
-                header_buffer = b""
-                body_buffer = b""
-                headers_parsed = False
-                
+                # Format and send request to upstream (head and body
+                # go out together without being concatenated first). Empty
+                # parts are dropped: on Python 3.12+ an empty buffer left in
+                # the transport keeps wait_closed() from ever returning.
+                request_parts = [part for part in HTTPParser.format_request_parts(request) if part]
                 while True:
-                    data = await asyncio.wait_for(
-                        server_reader.read(4096),
+                    try:
+                        server_writer.writelines(request_parts)
+                        await server_writer.drain()
+                        data = await asyncio.wait_for(
+                            server_reader.read(READ_CHUNK_SIZE),
+                            timeout=self.timeout
+                        )
+                    except ConnectionError:
+                        if not reused:
+                            raise
+                        data = b''
+                    if data or not reused:
+                        break
+                    # The origin dropped the idle connection; retry on a fresh one
+                    self._discard_upstream(server_writer)
+                    server_reader, server_writer = await asyncio.wait_for(
+                        asyncio.open_connection(target_host, target_port),
                         timeout=self.timeout
                     )
-                    if not data:
-                        break
-                    
+                    reused = False
+                
+                # Relay response back to client & Capture for Cache
+                capture = self.cache_enabled and request.method == 'GET'
+                buffering = capture
+                response_len = 0
+                buf = bytearray()
+                
+                # Response framing, known once the upstream head is in
+                head = bytearray()
+                head_end = -1
+                remaining = None  # Body bytes still due; None reads until EOF
+                keep_alive = False
+                
+                client_transport = client_writer.transport
+                while data:
+                    # Only yield to drain when the client falls behind, or
+                    # when it has gone away so drain() raises and ends the relay
                     client_writer.write(data)
-                    await client_writer.drain()
+                    if (client_transport.get_write_buffer_size() > WRITE_HIGH_WATER
+                            or client_transport.is_closing()):
+                        await client_writer.drain()
+                    
+                    response_len += len(data)
                     
                     # Buffer for caching
-                    if self.cache_enabled and request.method == 'GET':
-                        response_buffer += data
+                    if buffering:
+                        buf += data
                         
-                        # Try to split headers/body if not done yet
-                        if not headers_parsed and b"\r\n\r\n" in response_buffer:
-                            parts = response_buffer.split(b"\r\n\r\n", 1)
-                            header_buffer = parts[0] + b"\r\n\r\n"
-                            if len(parts) > 1:
-                                body_buffer = parts[1]
-                            headers_parsed = True
-                        elif headers_parsed:
-                            body_buffer += data
+                        if head_end < 0 and len(buf) >= 13 and not buf.startswith(_CACHEABLE_STATUS):
+                            # Only 200 responses are cached; stop buffering
+                            buffering = False
+                            buf = bytearray()
+                    
+                    # Track where the response ends so the connection can be reused
+                    if head_end < 0:
+                        start = max(0, len(head) - 3)
+                        head += data
+                        head_end = head.find(b"\r\n\r\n", start)
+                        if head_end >= 0:
+                            body_len, keep_alive = HTTPParser.response_framing(
+                                bytes(head[:head_end + 4]), request.method
+                            )
+                            if body_len is not None:
+                                remaining = body_len - (len(head) - head_end - 4)
+                            head = None
+                            if buffering and (body_len is None or body_len > CACHE_MAX_BYTES):
+                                # Too large to cache, or no length to verify it against
+                                buffering = False
+                                buf = bytearray()
+                        elif len(head) > READ_CHUNK_SIZE:
+                            # No recognisable head; relay until close
+                            head_end = len(head)
+                            head = None
+                    elif remaining is not None:
+                        remaining -= len(data)
+                    
+                    if remaining is not None and remaining <= 0:
+                        break
+                    data = await asyncio.wait_for(
+                        server_reader.read(
+                            READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+                        ),
+                        timeout=self.timeout
+                    )
+                
+                # Only a cleanly delimited response leaves the connection reusable
+                release = reusable and keep_alive and remaining == 0
 
                 # --- SAVE TO CACHE ---
-                if self.cache_enabled and request.method == 'GET' and headers_parsed:
-                    # Simple check: only cache 200 OK
-                    if b"200 OK" in header_buffer:
-                        self.cache.put(request.target, 200, header_buffer, body_buffer)
-                        self.logger.log_debug("CACHE_MISS_STORED", url=request.target)
+                if buffering and remaining == 0:
+                    view = memoryview(buf)
+                    header_buffer = bytes(view[:head_end + 4])
+                    body_buffer = bytes(view[head_end + 4:])
+                    view.release()
+                    self.cache.put(request.target, 200, header_buffer, body_buffer)
+                    self.logger.log_debug("CACHE_MISS_STORED", url=request.target)
 
                 # Log successful request
                 self.logger.log_request_allowed(
                     client_ip, client_port, target_host, target_port,
-                    request_line, status_code=200, bytes_sent=len(response_buffer)
+                    request_line, status_code=200, bytes_sent=response_len
                 )
-                self.tracker.record_allowed_request(bytes_received=len(response_buffer))
+                self.tracker.record_allowed_request(bytes_received=response_len)
                 
             finally:
-                try:
-                    server_writer.close()
-                    await server_writer.wait_closed()
-                except Exception:
-                    pass
+                if release:
+                    self._release_upstream(target_host, target_port, server_reader, server_writer)
+                else:
+                    try:
+                        server_writer.close()
+                    except Exception:
+                        pass
+                    await self._wait_closed(server_writer)
         
         except Exception as e:
             self.logger.log_error('HTTP_HANDLER_ERROR', client_ip, target_host, str(e)[:100])
     
+    async def _acquire_upstream(self, host: str, port: int, reusable: bool
+                                ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        """Take an idle pooled connection to host:port, or open a new one"""
+        key = (host, port)
+        idle = self._upstream_pool.get(key) if reusable else None
+        while idle:
+            # Most recently released first: the least likely to have timed out
+            reader, writer, watcher = idle.pop()
+            self._pooled -= 1
+            if not idle:
+                del self._upstream_pool[key]
+            # Let the watcher's pending read finish unwinding before reuse;
+            # if it completed on its own, the origin sent or closed something
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+            if not watcher.cancelled() or not self._is_reusable(reader, writer):
+                self._discard_upstream(writer)
+                continue
+            return reader, writer, True
+        
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port),
+            timeout=self.timeout
+        )
+        return reader, writer, False
+    
+    def _release_upstream(self, host: str, port: int,
+                          reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter) -> None:
+        """Return a finished keep-alive connection to the pool"""
+        # Bytes past the end of the response mean the framing was off;
+        # they must never reach the next request on this connection
+        if not self._is_reusable(reader, writer):
+            self._discard_upstream(writer)
+            return
+        
+        key = (host, port)
+        idle = self._upstream_pool.get(key)
+        if idle is None:
+            idle = self._upstream_pool[key] = deque()
+        else:
+            self._upstream_pool.move_to_end(key)
+        watcher = asyncio.ensure_future(self._watch_idle(key, reader, writer))
+        idle.append((reader, writer, watcher))
+        self._pooled += 1
+        
+        # Evict oldest connections: first for this host, then least recently used hosts
+        if len(idle) > POOL_MAX_PER_HOST:
+            self._drop_idle(idle.popleft())
+            self._pooled -= 1
+        while self._pooled > POOL_MAX_TOTAL:
+            lru_key, lru_idle = next(iter(self._upstream_pool.items()))
+            self._drop_idle(lru_idle.popleft())
+            self._pooled -= 1
+            if not lru_idle:
+                del self._upstream_pool[lru_key]
+    
+    async def _watch_idle(self, key: Tuple[str, int],
+                          reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter) -> None:
+        """Evict a pooled connection once it idles out or the origin sends anything"""
+        try:
+            await asyncio.wait_for(reader.read(1), timeout=POOL_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            pass
+        
+        # Only close it if it is still pooled; once acquired it belongs to a request
+        idle = self._upstream_pool.get(key)
+        if not idle:
+            return
+        for entry in idle:
+            if entry[1] is writer:
+                idle.remove(entry)
+                self._pooled -= 1
+                if not idle:
+                    del self._upstream_pool[key]
+                self._discard_upstream(writer)
+                return
+    
+    @staticmethod
+    def _is_reusable(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Check that a connection is open and has nothing unread buffered"""
+        # StreamReader has no public way to peek at buffered bytes
+        return not (writer.is_closing() or reader.at_eof() or reader._buffer)
+    
+    def _drop_idle(self, entry: Tuple[asyncio.StreamReader, asyncio.StreamWriter, asyncio.Future]) -> None:
+        """Close an evicted pool entry and stop its idle watcher"""
+        entry[2].cancel()
+        self._discard_upstream(entry[1])
+    
+    @staticmethod
+    def _discard_upstream(writer: asyncio.StreamWriter) -> None:
+        """Close an upstream connection without waiting for it"""
+        try:
+            writer.close()
+        except Exception:
+            pass
+    
     async def handle_connect_tunnel(self, reader: asyncio.StreamReader,
                                    writer: asyncio.StreamWriter,
                                    target_host: str, target_port: int,
                                    client_ip: str, client_port: int,
-                                   request_line: str) -> None:
-        """Handle HTTPS CONNECT tunneling"""
+                                   request_line: Tuple[str, str, str],
+                                   initial_data: bytes = b'') -> None:
+        """
+        Handle HTTPS CONNECT tunneling
+        
+        initial_data holds client bytes already read past the CONNECT
+        request; they are sent upstream before the tunnel starts.
+        """
         try:
             # Connect to upstream server
             try:
@@ -266,22 +588,27 @@ class ProxyServer:
                     timeout=self.timeout
                 )
             except Exception:
-                response = b"HTTP/1.1 502 Bad Gateway\r\n\r\n"
-                writer.write(response)
+                writer.write(_RESP_502_TUNNEL)
                 await writer.drain()
                 return
             
             try:
-                # Send "200 Connection Established" to client
-                response = b"HTTP/1.1 200 Connection Established\r\n\r\n"
-                writer.write(response)
-                await writer.drain()
+                # Send "200 Connection Established" to client; no drain here,
+                # it is flushed ahead of the first tunnel write (FIFO transport,
+                # and the splice path drains both writers before it starts)
+                writer.write(_CONNECT_200)
+                
+                if initial_data:
+                    server_writer.write(initial_data)
                 
                 # Create bidirectional tunnel
-                await asyncio.gather(
-                    self._forward_data(reader, server_writer, client_ip, True),
-                    self._forward_data(server_reader, writer, client_ip, False)
-                )
+                if self._can_splice(writer, server_writer):
+                    await self._splice_tunnel(reader, writer, server_reader, server_writer)
+                else:
+                    await self._run_tunnel(
+                        self._forward_data(reader, server_writer, client_ip, True),
+                        self._forward_data(server_reader, writer, client_ip, False)
+                    )
                 
                 self.logger.log_request_allowed(
                     client_ip, client_port, target_host, target_port,
@@ -292,26 +619,150 @@ class ProxyServer:
             finally:
                 try:
                     server_writer.close()
-                    await server_writer.wait_closed()
                 except Exception:
                     pass
+                await self._wait_closed(server_writer)
         
         except Exception as e:
             self.logger.log_error('CONNECT_HANDLER_ERROR', client_ip, target_host, str(e)[:100])
     
+    @staticmethod
+    async def _run_tunnel(*directions) -> None:
+        """
+        Run both directions of a tunnel until each has finished
+        
+        A direction that ends at EOF leaves the other running (half-close);
+        one that fails cancels the other at once, like a TaskGroup would.
+        """
+        tasks = [asyncio.ensure_future(direction) for direction in directions]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Reap the tasks; a failed direction just ends the tunnel
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
     async def _forward_data(self, reader: asyncio.StreamReader,
                            writer: asyncio.StreamWriter,
                            client_ip: str, from_client: bool) -> None:
         """Forward data between client and server"""
+        transport = writer.transport
+        while True:
+            data = await reader.read(READ_CHUNK_SIZE)
+            if not data or transport.is_closing():
+                break
+            # Payload is opaque, so write straight to the transport and
+            # only wait when the peer falls behind
+            transport.write(data)
+            if transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                await writer.drain()
+        
+        # Propagate the half-close so the peer sees EOF too
+        if not transport.is_closing() and writer.can_write_eof():
+            writer.write_eof()
+    
+    @staticmethod
+    def _can_splice(*writers: asyncio.StreamWriter) -> bool:
+        """Check whether a tunnel can be spliced between raw sockets"""
+        if not SPLICE_AVAILABLE:
+            return False
+        for writer in writers:
+            if (writer.get_extra_info('socket') is None
+                    or writer.get_extra_info('sslcontext') is not None):
+                return False
+        return True
+    
+    async def _splice_tunnel(self, client_reader: asyncio.StreamReader,
+                             client_writer: asyncio.StreamWriter,
+                             server_reader: asyncio.StreamReader,
+                             server_writer: asyncio.StreamWriter) -> None:
+        """Relay a CONNECT tunnel in-kernel, bypassing the stream objects"""
+        # Stop the transports reading so the splice pumps own the sockets
+        client_writer.transport.pause_reading()
+        server_writer.transport.pause_reading()
+        
+        # Hand over anything the stream readers already pulled in
+        # (StreamReader has no public API to take its buffer without waiting)
+        for reader, writer in ((client_reader, server_writer),
+                               (server_reader, client_writer)):
+            if reader._buffer:
+                writer.write(bytes(reader._buffer))
+                reader._buffer.clear()
+        
+        # Flush queued writes completely before writing behind the transports
+        for writer in (client_writer, server_writer):
+            writer.transport.set_write_buffer_limits(high=0)
+            await writer.drain()
+        
+        # Duplicated descriptors can be watched by the event loop even though
+        # the originals are registered to their transports
+        client_sock = self._dup_socket(client_writer)
+        server_sock = self._dup_socket(server_writer)
+        try:
+            await self._run_tunnel(
+                self._splice_pump(client_sock, server_sock),
+                self._splice_pump(server_sock, client_sock)
+            )
+        finally:
+            client_sock.close()
+            server_sock.close()
+    
+    @staticmethod
+    def _dup_socket(writer: asyncio.StreamWriter) -> socket.socket:
+        """Non-blocking duplicate of a stream's underlying socket"""
+        sock = socket.socket(fileno=os.dup(writer.get_extra_info('socket').fileno()))
+        sock.setblocking(False)
+        return sock
+    
+    @staticmethod
+    async def _wait_fd(fd: int, writable: bool) -> None:
+        """Wait until fd is readable (or writable)"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        
+        def on_ready() -> None:
+            if not ready.done():
+                ready.set_result(None)
+        
+        if writable:
+            loop.add_writer(fd, on_ready)
+        else:
+            loop.add_reader(fd, on_ready)
+        try:
+            await ready
+        finally:
+            if writable:
+                loop.remove_writer(fd)
+            else:
+                loop.remove_reader(fd)
+    
+    async def _splice_pump(self, src: socket.socket, dst: socket.socket) -> None:
+        """Move bytes src -> pipe -> dst with splice(2) until EOF"""
+        flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        pipe_r, pipe_w = os.pipe()
         try:
             while True:
-                data = await reader.read(4096)
-                if not data:
+                try:
+                    pending = os.splice(src_fd, pipe_w, SPLICE_CHUNK_SIZE, flags=flags)
+                except BlockingIOError:
+                    await self._wait_fd(src_fd, writable=False)
+                    continue
+                if not pending:
                     break
-                writer.write(data)
-                await writer.drain()
-        except Exception:
-            pass
+                
+                while pending:
+                    try:
+                        pending -= os.splice(pipe_r, dst_fd, pending, flags=flags)
+                    except BlockingIOError:
+                        await self._wait_fd(dst_fd, writable=True)
+            
+            # Propagate the half-close so the peer sees EOF too
+            dst.shutdown(socket.SHUT_WR)
+        finally:
+            os.close(pipe_r)
+            os.close(pipe_w)
 
 
 async def main():
@@ -355,11 +806,22 @@ async def main():
             server.start(),
             print_stats()
         )
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # Ctrl-C under asyncio.run() arrives as cancellation of this task
         print("\n[*] Server shutting down...")
+    finally:
         server.running = False
         server.logger.log_server_stop()
+        server.logger.close()
+        if server.cache is not None:
+            server.cache.close()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    # Run on uvloop's libuv event loop when it is installed
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -0,0 +1,9 @@
+"""
+Pytest configuration
+Makes the modules in src/ importable the same way run.bat runs them
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
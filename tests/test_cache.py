@@ -0,0 +1,156 @@
+"""
+Tests for LRUCache
+Covers storage, ETag handling, the 304 response, counter-based eviction
+TTL expiry and the clock thread's lifetime
+"""
+
+import gc
+import threading
+import time
+import weakref
+
+from cache import LRUCache
+
+HEAD = b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n'
+
+
+def test_put_and_get_roundtrip():
+    cache = LRUCache()
+    cache.put('http://a/', 200, HEAD, b'hello')
+    entry = cache.get('http://a/')
+    assert entry.body == b'hello'
+    assert entry.headers.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert entry.wire == entry.headers + entry.body
+    assert cache.get('http://b/') is None
+
+
+def test_etag_is_generated_and_kept():
+    cache = LRUCache()
+    cache.put('http://a/', 200, HEAD, b'hello')
+    generated = cache.get('http://a/')
+    assert generated.etag.startswith('"') and generated.etag.encode() in generated.headers
+    
+    cache.put('http://b/', 200, b'HTTP/1.1 200 OK\r\nETag: W/"v1"\r\n\r\n', b'x')
+    assert cache.get('http://b/').etag == 'W/"v1"'
+
+
+def test_etag_matching():
+    cache = LRUCache()
+    cache.put('http://a/', 200, b'HTTP/1.1 200 OK\r\nETag: "v1"\r\n\r\n', b'x')
+    entry = cache.get('http://a/')
+    assert entry.etag_matches('"v1"')
+    assert entry.etag_matches('W/"v1"')
+    assert entry.etag_matches('"v0", "v1"')
+    assert entry.etag_matches('*')
+    assert not entry.etag_matches('"v2"')
+
+
+def test_not_modified_response():
+    cache = LRUCache()
+    cache.put('http://a/', 200, b'HTTP/1.1 200 OK\r\nETag: "v1"\r\n\r\n', b'body')
+    response = cache.get('http://a/').not_modified
+    assert response.startswith(b'HTTP/1.1 304 ')
+    assert b'ETag: "v1"' in response
+    assert not response.endswith(b'body')
+
+
+def test_size_is_bounded():
+    cache = LRUCache(max_size_bytes=16 * 1024)
+    for i in range(400):
+        cache.put(f'http://a/{i}', 200, HEAD, b'x' * 100)
+        assert cache.current_size <= cache.max_size
+    assert cache.get('http://a/399') is not None
+
+
+class OneShard(LRUCache):
+    """Single shard, so every URL competes for the same budget"""
+    NUM_SHARDS = 1
+    MAX_COUNT = 4
+
+
+def filled(*urls):
+    """OneShard cache with room for exactly three entries, holding urls"""
+    probe = LRUCache()
+    probe.put('x', 200, HEAD, b'hello')
+    cache = OneShard(max_size_bytes=3 * probe.current_size)
+    for url in urls:
+        cache.put(url, 200, HEAD, b'hello')
+    return cache
+
+
+def test_least_used_entry_is_evicted():
+    cache = filled('a', 'b', 'c')
+    cache.get('a')
+    cache.get('a')
+    cache.get('c')
+    cache.put('d', 200, HEAD, b'hello')
+    assert [url for url in 'abcd' if cache.get(url)] == ['a', 'c', 'd']
+
+
+def test_eviction_ties_go_to_the_oldest_entry():
+    cache = filled('a', 'b', 'c')
+    cache.put('d', 200, HEAD, b'hello')
+    assert [url for url in 'abcd' if cache.get(url)] == ['b', 'c', 'd']
+    
+    # Replacing an entry makes it the newest again
+    cache = filled('a', 'b', 'c')
+    cache.put('a', 200, HEAD, b'hello')
+    cache.put('d', 200, HEAD, b'hello')
+    assert [url for url in 'abcd' if cache.get(url)] == ['a', 'c', 'd']
+
+
+def test_counters_are_halved_past_max_count():
+    cache = filled('a', 'b', 'c')
+    cache.get('b')
+    for _ in range(3):
+        cache.get('a')
+    assert cache._counts[0] == {'a': 4, 'b': 2, 'c': 1}
+    
+    cache.get('a')  # a reaches MAX_COUNT + 1: every counter is halved
+    assert cache._counts[0] == {'a': 2, 'b': 1, 'c': 0}
+    
+    # Old popularity has decayed: three fresh hits now outrank a's five
+    for _ in range(2):
+        cache.get('b')
+    for _ in range(3):
+        cache.get('c')
+    cache.put('d', 200, HEAD, b'hello')
+    assert [url for url in 'abcd' if cache.get(url)] == ['b', 'c', 'd']
+
+
+class FrozenClock(LRUCache):
+    """Background clock effectively stopped, so tests drive _now by hand"""
+    CLOCK_RESOLUTION = 3600
+
+
+def test_entries_expire_on_the_coarse_clock():
+    cache = FrozenClock(ttl_seconds=10)
+    cache._now = 1000.0
+    cache.put('http://a/', 200, HEAD, b'hello')
+    
+    # Only the cached clock counts, not how much real time has passed
+    cache._now = 1010.0
+    assert cache.get('http://a/') is not None
+    cache._now = 1010.5
+    assert cache.get('http://a/') is None
+    assert cache.current_size == 0
+
+
+def test_clock_thread_does_not_keep_the_cache_alive():
+    cache = LRUCache()
+    cache.put('http://a/', 200, HEAD, b'x' * (1 << 20))
+    ref = weakref.ref(cache)
+    del cache
+    gc.collect()
+    assert ref() is None
+
+
+def test_close_stops_the_clock_thread():
+    before = threading.active_count()
+    cache = LRUCache()
+    assert threading.active_count() == before + 1
+    cache.close()
+    deadline = time.monotonic() + 5
+    while threading.active_count() > before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == before
@@ -0,0 +1,124 @@
+"""
+Tests for FilterManager and AuthenticationManager
+Covers exact, wildcard (suffix trie) and CIDR (prefix trie) rules, and
+Proxy-Authorization checks against the pre-encoded credential tokens
+"""
+
+import base64
+
+import pytest
+
+from filter_manager import AuthenticationManager, FilterManager
+from http_parser import HTTPRequest
+
+
+@pytest.fixture
+def filters(tmp_path):
+    blacklist = tmp_path / 'blocked.txt'
+    blacklist.write_text(
+        '# comment\n'
+        'example.com\n'
+        '*.ads-tracker.com\n'
+        '*.deep.sub.net\n'
+        '192.0.2.5\n'
+        '10.0.0.0/8\n'
+        '10.1.0.0/16\n'
+        '172.16.0.0/12\n'
+        '2001:db8::/32\n'
+    )
+    return FilterManager(str(blacklist))
+
+
+@pytest.mark.parametrize('host, blocked', [
+    ('example.com', True),
+    ('EXAMPLE.COM:80', True),
+    ('www.example.com', False),
+    ('ads-tracker.com', True),
+    ('a.ads-tracker.com', True),
+    ('x.y.ads-tracker.com', True),
+    ('notads-tracker.com', False),
+    ('sub.net', False),
+    ('deep.sub.net', True),
+    ('a.deep.sub.net', True),
+    ('google.com', False),
+])
+def test_domain_rules(filters, host, blocked):
+    assert filters.is_blocked(host)[0] is blocked
+
+
+@pytest.mark.parametrize('host, blocked', [
+    ('192.0.2.5', True),
+    ('192.0.2.6', False),
+    ('10.0.0.1', True),
+    ('10.255.255.255:8080', True),
+    ('11.0.0.1', False),
+    ('172.16.0.1', True),
+    ('172.31.255.255', True),
+    ('172.32.0.1', False),
+    ('2001:db8::1', True),
+    ('2001:db9::1', False),
+    ('::1', False),
+    ('[2001:db8::1]', True),
+    ('[2001:db8::1]:443', True),
+    ('[2001:db9::1]:443', False),
+])
+def test_ip_rules(filters, host, blocked):
+    assert filters.is_blocked(host)[0] is blocked
+
+
+@pytest.mark.parametrize('target, headers', [
+    ('http://[2001:db8::1]:8080/', {}),
+    ('/', {'host': '[2001:db8::1]:8080'}),
+])
+def test_ipv6_literal_request_is_blocked(filters, target, headers):
+    request = HTTPRequest('GET', target, 'HTTP/1.1', headers)
+    assert filters.is_blocked(request.hostname)[0] is True
+
+
+def test_longest_prefix_is_reported(filters):
+    assert filters.is_blocked('10.1.2.3')[1].endswith('10.1.0.0/16')
+    assert filters.is_blocked('10.2.2.3')[1].endswith('10.0.0.0/8')
+
+
+def test_default_route_blocks_everything():
+    filters = FilterManager()
+    filters._add_rule('0.0.0.0/0')
+    assert filters.is_blocked('1.2.3.4')[0]
+    assert not filters.is_blocked('example.org')[0]
+
+
+def basic(credentials: str) -> str:
+    """Proxy-Authorization value for user:pass"""
+    return 'Basic ' + base64.b64encode(credentials.encode()).decode()
+
+
+@pytest.fixture
+def auth(tmp_path):
+    users = tmp_path / 'users.txt'
+    users.write_text('# comment\nalice:secret\nbob:pa:ss\n')
+    return AuthenticationManager(str(users))
+
+
+@pytest.mark.parametrize('header, valid', [
+    (basic('alice:secret'), True),
+    (basic('bob:pa:ss'), True),
+    (basic('alice:secret') + '  ', True),
+    (basic('alice:wrong'), False),
+    (basic('bob:secret'), False),
+    (basic('mallory:secret'), False),
+    (basic('alice:secretx'), False),
+    ('Basic not-base64!', False),
+    ('Bearer ' + basic('alice:secret')[6:], False),
+    ('Basic ', False),
+    ('', False),
+    (None, False),
+])
+def test_auth_validate(auth, header, valid):
+    assert auth.enabled
+    assert auth.validate(header) is valid
+
+
+def test_auth_disabled_allows_everyone(tmp_path):
+    auth = AuthenticationManager(str(tmp_path / 'missing.txt'))
+    assert not auth.enabled
+    assert auth.validate(None) is True
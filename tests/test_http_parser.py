@@ -0,0 +1,187 @@
+"""
+Tests for the HTTP parser
+Covers request parsing, target splitting, host peeking and response framing
+"""
+
+import asyncio
+import re
+
+import pytest
+
+from http_parser import HTTPParser, HTTPRequest
+
+
+def parse(raw: bytes):
+    """Run parse_request over a complete byte string"""
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await HTTPParser.parse_request(reader)
+    return asyncio.run(run())
+
+
+def legacy_target(method, target, headers):
+    """(host, port, hostname, upstream target) as the original regex code derived them"""
+    absolute = target.startswith(('http://', 'https://'))
+    host = None
+    if absolute:
+        m = re.match(r'https?://([^/]+)', target)
+        host = m.group(1) if m else None
+    if not host:
+        host = headers.get('host')
+    
+    port = None
+    if absolute:
+        m = re.match(r'https?://([^/:]+):(\d+)', target)
+        port = int(m.group(2)) if m else None
+    if port is None:
+        if method.upper() == 'CONNECT':
+            port = 443
+            if ':' in target:
+                try:
+                    port = int(target.split(':')[1])
+                except (ValueError, IndexError):
+                    pass
+        else:
+            port = 443 if target.startswith('https://') else 80
+    
+    hostname = host.split(':')[0] if host else None
+    
+    if method.upper() == 'CONNECT':
+        upstream = target
+    elif absolute:
+        m = re.match(r'https?://[^/]+(/.*)', target)
+        upstream = m.group(1) if m else '/'
+    else:
+        upstream = target
+    return host, port, hostname, upstream
+
+
+TARGETS = [
+    'http://a.com', 'http://a.com/', 'http://a.com:81/x', 'https://a.com:x/y',
+    'https://a.com/p?q', 'http:///x', 'http://:80/x', 'http://a:8a/x',
+    'a.com:444', 'a.com', 'a.com:zz', '/rel', '*', 'http://a.com:/z',
+    'http://a.com:99',
+]
+
+
+@pytest.mark.parametrize('method', ['GET', 'CONNECT'])
+@pytest.mark.parametrize('target', TARGETS)
+@pytest.mark.parametrize('headers', [{}, {'host': 'hh:12'}])
+def test_target_split_matches_legacy(method, target, headers):
+    request = HTTPRequest(method, target, 'HTTP/1.1', headers)
+    got = (request.host, request.port, request.hostname, request.get_target_for_upstream())
+    assert got == legacy_target(method, target, headers)
+
+
+def test_parse_request_lowercases_header_names():
+    request, _ = parse(
+        b'post http://ex.com:8080/a?b=1 HTTP/1.1\r\n'
+        b'Host: ex.com:8080\r\n'
+        b'X-Custom-Header:  value \r\n'
+        b'X-Spaced-Name : dropped\r\n'
+        b' X-Folded: dropped\r\n'
+        b'Content-Length: 3\r\n\r\n'
+        b'abc'
+    )
+    assert request.method == 'POST'
+    assert request.port == 8080 and request.hostname == 'ex.com'
+    assert request.get_target_for_upstream() == '/a?b=1'
+    assert request.headers['x-custom-header'] == 'value'
+    # Names with whitespace around them are not headers
+    assert set(request.headers) == {'host', 'x-custom-header', 'content-length'}
+    assert request.body == b'abc'
+
+
+def test_parse_request_returns_data_past_the_body():
+    request, rest = parse(
+        b'POST http://ex.com/ HTTP/1.1\r\n'
+        b'Content-Length: 3\r\n\r\n'
+        b'abcEXTRA'
+    )
+    assert request.body == b'abc' and rest == b'EXTRA'
+
+
+def test_parse_request_rejects_bad_input():
+    assert parse(b'GARBAGE\r\n\r\n') == (None, b'')
+    assert parse(b'GET / HTTP/1.1\r\nHost: a') == (None, b'')
+    assert parse(b'GET / HTTP/1.1\r\nX: ' + b'a' * HTTPParser.MAX_HEADER_SIZE + b'\r\n\r\n') == (None, b'')
+
+
+def test_format_request_parts():
+    request, _ = parse(b'GET http://ex.com/p HTTP/1.1\r\nHost: ex.com\r\n\r\n')
+    head, body = HTTPParser.format_request_parts(request)
+    assert head == b'GET /p HTTP/1.1\r\nhost: ex.com\r\n\r\n'
+    assert body == b''
+
+
+@pytest.mark.parametrize('target, headers, hostname, port', [
+    ('http://[2001:db8::1]:8080/', {}, '2001:db8::1', 8080),
+    ('http://[2001:db8::1]/', {}, '2001:db8::1', 80),
+    ('/', {'host': '[::1]:8080'}, '::1', 80),
+    ('/', {'host': '[::1]'}, '::1', 80),
+])
+def test_ipv6_literal_hostname(target, headers, hostname, port):
+    request = HTTPRequest('GET', target, 'HTTP/1.1', headers)
+    assert (request.hostname, request.port) == (hostname, port)
+
+
+def test_connect_ipv6_literal_port():
+    request = HTTPRequest('CONNECT', '[::1]:8443', 'HTTP/1.1', {'host': '[::1]:8443'})
+    assert (request.hostname, request.port) == ('::1', 8443)
+
+
+@pytest.mark.parametrize('head', [
+    b'GET http://a.com/x HTTP/1.1\r\nHost: b.com',
+    b'GET http://a.com:81 HTTP/1.1',
+    b'GET / HTTP/1.1\r\nhost:  c.com:8080 ',
+    b'CONNECT d.com:443 HTTP/1.1\r\nHost: d.com:443',
+    b'CONNECT d.com:443 HTTP/1.1',
+    b'GET https://e.com?q HTTP/1.1',
+    b'GET http:///x HTTP/1.1\r\nHOST: f.com',
+    b'GET / HTTP/1.1\r\nX: 1\r\nHost:\r\n',
+    b'GET /',
+    b'GET HTTP://g.com/ HTTP/1.1\r\nHost: h',
+    b'GET http://[2001:db8::1]:8080/ HTTP/1.1',
+    b'GET / HTTP/1.1\r\nHost: [::1]:8080',
+    b'CONNECT [::1]:8443 HTTP/1.1\r\nHost: [::1]:8443',
+    b'GET / HTTP/1.1\r\nHost: blocked.test\r\nHost: ok.test',
+    b'GET / HTTP/1.1\r\nHost: blocked.test\r\nhost: ok.test',
+    b'GET / HTTP/1.1\r\nhost: blocked.test\r\nHost: ok.test',
+    b'GET / HTTP/1.1\r\nHost: blocked.test\r\nHost : ok.test',
+    b'GET / HTTP/1.1\r\nHost: blocked.test\r\n Host: ok.test',
+])
+def test_peek_host_matches_hostname(head):
+    request, _ = parse(head + b'\r\n\r\n')
+    hostname = request.hostname if request else None
+    peeked = HTTPParser.peek_host(head)
+    assert (peeked.decode() if peeked else None) == hostname
+
+
+@pytest.mark.parametrize('head, method, expected', [
+    (b'HTTP/1.1 200 OK\r\nContent-Length: 12\r\n\r\n', 'GET', (12, True)),
+    (b'HTTP/1.1 200 OK\r\ncontent-length: 0\r\n\r\n', 'GET', (0, True)),
+    (b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\nConnection: close\r\n\r\n', 'GET', (5, False)),
+    (b'HTTP/1.0 200 OK\r\nContent-Length: 5\r\n\r\n', 'GET', (5, False)),
+    (b'HTTP/1.0 200 OK\r\nContent-Length: 5\r\nConnection: Keep-Alive\r\n\r\n', 'GET', (5, True)),
+    (b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n', 'GET', (None, False)),
+    (b'HTTP/1.1 200 OK\r\n\r\n', 'GET', (None, False)),
+    (b'HTTP/1.1 200 OK\r\nContent-Length: abc\r\n\r\n', 'GET', (None, False)),
+    (b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n\r\n', 'GET', (None, False)),
+    (b'garbage\r\n\r\n', 'GET', (None, False)),
+    # Bodyless, but a stray body could follow: never reusable
+    (b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n', 'HEAD', (0, False)),
+    (b'HTTP/1.1 204 No Content\r\n\r\n', 'GET', (0, False)),
+    (b'HTTP/1.1 304 Not Modified\r\nContent-Length: 9\r\n\r\n', 'GET', (0, False)),
+])
+def test_response_framing(head, method, expected):
+    assert HTTPParser.response_framing(head, method) == expected
+
+
+def test_error_responses_are_prerendered():
+    response = HTTPParser.format_error_response(403, 'Forbidden')
+    assert response is HTTPParser.format_error_response(403)
+    assert response.startswith(b'HTTP/1.1 403 Forbidden\r\n')
+    custom = HTTPParser.format_error_response(403, 'Nope')
+    assert custom.startswith(b'HTTP/1.1 403 Nope\r\n')
@@ -0,0 +1,33 @@
+"""
+Tests for ProxyLogger
+Covers the queued file writes and detaching from the shared loggers on close
+"""
+
+import logging
+
+from logger import ProxyLogger
+
+
+def test_records_reach_the_file_after_close(tmp_path):
+    proxy_logger = ProxyLogger(log_dir=str(tmp_path))
+    proxy_logger.log_server_start('127.0.0.1', 8888)
+    proxy_logger.log_error('UPSTREAM', '10.0.0.1', 'example.com', 'refused')
+    proxy_logger.close()
+    
+    assert 'SERVER_START | Listening on 127.0.0.1:8888' in (tmp_path / 'access.log').read_text()
+    assert 'UPSTREAM | Client: 10.0.0.1' in (tmp_path / 'error.log').read_text()
+
+
+def test_close_detaches_from_the_shared_loggers(tmp_path):
+    first = ProxyLogger(log_dir=str(tmp_path / 'first'))
+    handlers = [handler for _, handler in first._handlers]
+    first.close()
+    for name in ('access', 'error', 'debug'):
+        assert not set(handlers) & set(logging.getLogger(name).handlers)
+    
+    # A later instance writes only to its own files
+    second = ProxyLogger(log_dir=str(tmp_path / 'second'))
+    second.log_error('SECOND')
+    second.close()
+    assert 'SECOND' in (tmp_path / 'second' / 'error.log').read_text()
+    assert 'SECOND' not in (tmp_path / 'first' / 'error.log').read_text()
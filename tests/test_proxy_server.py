@@ -0,0 +1,545 @@
+"""
+Tests for ProxyServer
+Runs the proxy against local origin servers on ephemeral ports
+"""
+
+import asyncio
+import base64
+import contextlib
+import socket
+import struct
+
+import pytest
+
+import proxy_server
+from proxy_server import ProxyServer
+
+
+@contextlib.asynccontextmanager
+async def serving(origin_handler, log_dir, **options):
+    """Start an origin and a proxy; yield (proxy_port, origin_port, proxy)"""
+    origin = await asyncio.start_server(origin_handler, '127.0.0.1', 0)
+    proxy = ProxyServer(host='127.0.0.1', port=0, log_dir=str(log_dir), timeout=3, **options)
+    task = asyncio.create_task(proxy.start())
+    while not (proxy.server and proxy.server.sockets):
+        await asyncio.sleep(0.01)
+    try:
+        yield proxy.server.sockets[0].getsockname()[1], origin.sockets[0].getsockname()[1], proxy
+    finally:
+        task.cancel()
+        origin.close()
+        proxy.logger.close()
+        if proxy.cache is not None:
+            proxy.cache.close()
+
+
+async def fetch(proxy_port: int, raw: bytes, timeout: float = 3) -> bytes:
+    """Send one request through the proxy and read until it closes"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', proxy_port)
+    writer.write(raw)
+    await writer.drain()
+    try:
+        return await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+
+def test_close_delimited_get_finishes(tmp_path):
+    """A bodiless GET relayed until upstream close must not hang on close"""
+    async def origin(reader, writer):
+        await reader.readuntil(b'\r\n\r\n')
+        writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n'
+                     b'Connection: close\r\n\r\n3\r\nabc\r\n0\r\n\r\n')
+        await writer.drain()
+        writer.close()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, _):
+            return await fetch(port, f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode())
+    
+    assert asyncio.run(run()).endswith(b'0\r\n\r\n')
+
+
+def test_keep_alive_connections_are_reused(tmp_path):
+    connections = []
+    
+    async def origin(reader, writer):
+        connections.append(writer)
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except Exception:
+                break
+            body = head.split()[1]
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, _):
+            for i in range(3):
+                response = await fetch(port, f'GET http://127.0.0.1:{origin_port}/r{i} HTTP/1.1\r\n\r\n'.encode())
+                assert response.endswith(b'/r%d' % i)
+    
+    asyncio.run(run())
+    assert len(connections) == 1
+
+
+def test_stray_body_after_head_is_not_reused(tmp_path):
+    """Bytes an origin sends past a HEAD response must not reach the next client"""
+    async def origin(reader, writer):
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except Exception:
+                break
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n')
+            await writer.drain()
+            if head.startswith(b'HEAD'):
+                await asyncio.sleep(0.05)
+                writer.write(b'EVIL!')
+            else:
+                writer.write(b'clean')
+            await writer.drain()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, _):
+            await fetch(port, f'HEAD http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode())
+            await asyncio.sleep(0.2)
+            return await fetch(port, f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode())
+    
+    response = asyncio.run(run())
+    assert response.startswith(b'HTTP/1.1 200 OK') and response.endswith(b'clean')
+
+
+def test_idle_pooled_connection_is_evicted_on_data(tmp_path):
+    origin_writers = []
+    
+    async def origin(reader, writer):
+        origin_writers.append(writer)
+        while True:
+            try:
+                await reader.readuntil(b'\r\n\r\n')
+            except Exception:
+                break
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+            await writer.drain()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, proxy):
+            request = f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode()
+            await fetch(port, request)
+            assert proxy._pooled == 1
+            origin_writers[-1].write(b'JUNK')
+            await asyncio.sleep(0.1)
+            assert proxy._pooled == 0
+            return await fetch(port, request)
+    
+    assert asyncio.run(run()).startswith(b'HTTP/1.1 200 OK')
+
+
+def test_overloaded_client_gets_503(tmp_path):
+    async def origin(reader, writer):
+        writer.close()
+    
+    async def run():
+        async with serving(origin, tmp_path, max_connections=1) as (port, _, _proxy):
+            # Hold the only slot with a client that never sends a request
+            held = await asyncio.open_connection('127.0.0.1', port)
+            await asyncio.sleep(0.1)
+            response = await fetch(port, b'GET http://a.invalid/ HTTP/1.1\r\nHost: a.invalid\r\n\r\n')
+            held[1].close()
+            return response
+    
+    assert asyncio.run(run()).startswith(b'HTTP/1.1 503')
+
+
+def test_blocked_host_is_rejected(tmp_path):
+    blacklist = tmp_path / 'blocked.txt'
+    blacklist.write_text('blocked.test\n*.bad.test\n')
+    
+    async def origin(reader, writer):
+        writer.close()
+    
+    async def run():
+        async with serving(origin, tmp_path, blacklist_file=str(blacklist)) as (port, _, proxy):
+            first = await fetch(port, b'GET http://x.bad.test/ HTTP/1.1\r\n\r\n')
+            second = await fetch(port, b'GET / HTTP/1.1\r\nHost: blocked.test\r\n\r\n')
+            return first, second, proxy.tracker.get_stats()['blocked_requests']
+    
+    first, second, blocked = asyncio.run(run())
+    assert first.startswith(b'HTTP/1.1 403') and second.startswith(b'HTTP/1.1 403')
+    assert blocked == 2
+
+
+async def ok_origin(reader, writer):
+    await reader.readuntil(b'\r\n\r\n')
+    writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok')
+    await writer.drain()
+    writer.close()
+
+
+def test_reload_rules_blocks_a_memoized_host(tmp_path):
+    """A host already checked (and memoized as allowed) is blocked once a rule is added"""
+    blacklist = tmp_path / 'blocked.txt'
+    blacklist.write_text('blocked.test\n')
+    added = tmp_path / 'added.txt'
+    added.write_text('127.0.0.1\n')
+    
+    async def run():
+        async with serving(ok_origin, tmp_path, blacklist_file=str(blacklist)) as (port, origin_port, proxy):
+            request = f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode()
+            responses = [await fetch(port, request), await fetch(port, request)]
+            hits = proxy._is_blocked.cache_info().hits
+            proxy.reload_rules(blacklist_file=str(added))
+            responses.append(await fetch(port, request))
+            return responses, hits
+    
+    responses, hits = asyncio.run(run())
+    assert [r[:12] for r in responses] == [b'HTTP/1.1 200', b'HTTP/1.1 200', b'HTTP/1.1 403']
+    assert hits >= 1
+
+
+def test_reload_rules_accepts_new_credentials(tmp_path):
+    """Auth results are memoized per header value until reload_rules()"""
+    users = tmp_path / 'users.txt'
+    users.write_text('alice:secret\n')
+    added = tmp_path / 'added.txt'
+    added.write_text('carol:hunter2\n')
+    
+    def request(origin_port, credentials=None):
+        auth = ''
+        if credentials:
+            auth = 'Proxy-Authorization: Basic %s\r\n' % base64.b64encode(credentials.encode()).decode()
+        return f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n{auth}\r\n'.encode()
+    
+    async def run():
+        async with serving(ok_origin, tmp_path, auth_file=str(users)) as (port, origin_port, proxy):
+            responses = [
+                await fetch(port, request(origin_port)),
+                await fetch(port, request(origin_port, 'alice:wrong')),
+                await fetch(port, request(origin_port, 'alice:secret')),
+                await fetch(port, request(origin_port, 'alice:secret')),
+                await fetch(port, request(origin_port, 'carol:hunter2')),
+            ]
+            hits = proxy._validate_auth.cache_info().hits
+            proxy.reload_rules(auth_file=str(added))
+            responses.append(await fetch(port, request(origin_port, 'carol:hunter2')))
+            return responses, hits
+    
+    responses, hits = asyncio.run(run())
+    assert [r[:12] for r in responses] == [
+        b'HTTP/1.1 407', b'HTTP/1.1 407', b'HTTP/1.1 200',
+        b'HTTP/1.1 200', b'HTTP/1.1 407', b'HTTP/1.1 200',
+    ]
+    assert hits >= 1
+
+
+def test_client_abort_stops_upstream_relay(tmp_path):
+    """A client that goes away must end the relay of an endless response"""
+    async def run():
+        origin_done = asyncio.Event()
+        
+        async def origin(reader, writer):
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n')
+            try:
+                while True:
+                    writer.write(b'x' * 65536)
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+                with contextlib.suppress(ConnectionError):
+                    await writer.wait_closed()
+                origin_done.set()
+        
+        async with serving(origin, tmp_path) as (port, origin_port, _):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode())
+            await reader.readexactly(100 * 1024)
+            writer.transport.abort()
+            await asyncio.wait_for(origin_done.wait(), 5)
+    
+    asyncio.run(run())
+
+
+# Run tunnel tests over both relays: in-kernel splice and the stream copy loop
+TUNNEL_PATHS = [
+    pytest.param(True, id='splice', marks=pytest.mark.skipif(
+        not proxy_server.SPLICE_AVAILABLE, reason='needs splice(2)')),
+    pytest.param(False, id='streams'),
+]
+
+
+@pytest.fixture
+def spliced(request, monkeypatch):
+    """Select the tunnel relay; the yielded list records splice use"""
+    calls = []
+    splice_tunnel = ProxyServer._splice_tunnel
+    
+    async def spy(self, *args):
+        calls.append(args)
+        await splice_tunnel(self, *args)
+    
+    monkeypatch.setattr(proxy_server, 'SPLICE_AVAILABLE', request.param)
+    monkeypatch.setattr(ProxyServer, '_splice_tunnel', spy)
+    yield calls
+    assert bool(calls) is request.param
+
+
+def reset(writer: asyncio.StreamWriter) -> None:
+    """Close a connection with an RST instead of a FIN"""
+    writer.get_extra_info('socket').setsockopt(
+        socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    writer.transport.abort()
+
+
+def connect_request(origin_port: int) -> bytes:
+    target = f'127.0.0.1:{origin_port}'
+    return f'CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n'.encode()
+
+
+async def echo(reader, writer):
+    """Origin that echoes everything back and closes after the client's EOF"""
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+
+@pytest.mark.parametrize('spliced', TUNNEL_PATHS, indirect=True)
+def test_connect_tunnel_relays_both_ways(tmp_path, spliced):
+    """3MB through a CONNECT tunnel, with early data pipelined behind the request"""
+    payload = bytes(range(256)) * (3 * 4096)
+    
+    async def run():
+        async with serving(echo, tmp_path) as (port, origin_port, _):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(connect_request(origin_port) + payload[:1000])
+            
+            async def send():
+                writer.write(payload[1000:])
+                await writer.drain()
+                writer.write_eof()
+            
+            sender = asyncio.create_task(send())
+            try:
+                return await asyncio.wait_for(reader.read(), 10)
+            finally:
+                await sender
+                writer.close()
+    
+    head, _, body = asyncio.run(run()).partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 200')
+    assert body == payload
+
+
+@pytest.mark.parametrize('spliced', TUNNEL_PATHS, indirect=True)
+def test_connect_tunnel_half_close_keeps_reply(tmp_path, spliced):
+    """After the client's write_eof() the origin's reply must still come back"""
+    async def origin(reader, writer):
+        data = await reader.read()
+        writer.write(b'got %d bytes' % len(data))
+        writer.close()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, _):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(connect_request(origin_port) + b'x' * 5000)
+            await writer.drain()
+            writer.write_eof()
+            try:
+                return await asyncio.wait_for(reader.read(), 5)
+            finally:
+                writer.close()
+    
+    assert asyncio.run(run()).endswith(b'\r\n\r\ngot 5000 bytes')
+
+
+@pytest.mark.parametrize('spliced', TUNNEL_PATHS, indirect=True)
+@pytest.mark.parametrize('side', ['client', 'origin'])
+def test_connect_tunnel_ends_on_reset(tmp_path, spliced, side):
+    """A reset on either side must tear down the whole tunnel"""
+    async def run():
+        ready = asyncio.Event()
+        origin_done = asyncio.Event()
+        
+        async def origin(reader, writer):
+            await reader.readexactly(5)
+            ready.set()
+            if side == 'origin':
+                reset(writer)
+                return
+            try:
+                await reader.read()
+            except ConnectionError:
+                pass
+            origin_done.set()
+        
+        async with serving(origin, tmp_path) as (port, origin_port, _):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(connect_request(origin_port) + b'hello')
+            await asyncio.wait_for(ready.wait(), 5)
+            if side == 'client':
+                reset(writer)
+                await asyncio.wait_for(origin_done.wait(), 5)
+                return
+            try:
+                await asyncio.wait_for(reader.read(), 5)
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+    
+    asyncio.run(run())
+
+
+def counting_origin(response: bytes):
+    """Origin that answers every request with response, then closes; returns (handler, hits)"""
+    hits = []
+    
+    async def origin(reader, writer):
+        await reader.readuntil(b'\r\n\r\n')
+        hits.append(1)
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+    
+    return origin, hits
+
+
+def fetch_twice(tmp_path, response: bytes):
+    """GET one URL twice through a caching proxy; return both replies and the origin hits"""
+    origin, hits = counting_origin(response)
+    
+    async def run():
+        async with serving(origin, tmp_path, cache_enabled=True) as (port, origin_port, _):
+            request = f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode()
+            return [await fetch(port, request), await fetch(port, request)]
+    
+    return asyncio.run(run()), len(hits)
+
+
+def test_cacheable_response_is_served_from_cache(tmp_path):
+    (first, second), hits = fetch_twice(
+        tmp_path, b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello')
+    assert hits == 1
+    assert first.endswith(b'hello') and second.startswith(b'HTTP/1.1 200 OK')
+    assert second.endswith(b'\r\n\r\nhello')
+
+
+@pytest.mark.parametrize('response', [
+    b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % (proxy_server.CACHE_MAX_BYTES + 1)
+    + b'x' * (proxy_server.CACHE_MAX_BYTES + 1),
+    b'HTTP/1.1 404 Not Found\r\nContent-Length: 5\r\n\r\nnope!',
+    b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n',
+    b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nshort',
+], ids=['too-large', 'not-200', 'chunked', 'cut-short'])
+def test_uncacheable_response_is_fetched_again(tmp_path, response):
+    (first, second), hits = fetch_twice(tmp_path, response)
+    assert hits == 2
+    assert first == second == response
+
+
+def test_matching_if_none_match_gets_304_from_cache(tmp_path):
+    origin, hits = counting_origin(b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello')
+    
+    async def run():
+        async with serving(origin, tmp_path, cache_enabled=True) as (port, origin_port, proxy):
+            url = f'http://127.0.0.1:{origin_port}/'
+            await fetch(port, f'GET {url} HTTP/1.1\r\n\r\n'.encode())
+            cached = proxy.cache.get(url)
+            matching = await fetch(port, f'GET {url} HTTP/1.1\r\nIf-None-Match: {cached.etag}\r\n\r\n'.encode())
+            other = await fetch(port, f'GET {url} HTTP/1.1\r\nIf-None-Match: "other"\r\n\r\n'.encode())
+            return cached, matching, other
+    
+    cached, matching, other = asyncio.run(run())
+    assert len(hits) == 1
+    assert matching == cached.not_modified
+    assert other == cached.wire
+
+
+@pytest.mark.parametrize('framing', [b'Transfer-Encoding: chunked', b'Content-Length: +5'])
+def test_unread_request_body_does_not_poison_the_pool(tmp_path, framing):
+    """An origin that answers early, then reads a body the proxy never sent"""
+    async def origin(reader, writer):
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+                path = head.split()[1]
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(path) + path)
+                await writer.drain()
+                if b'chunked' in head:
+                    line = await reader.readline()
+                    while line != b'0\r\n':
+                        await reader.readexactly(int(line, 16) + 2)
+                        line = await reader.readline()
+                    await reader.readexactly(2)
+                elif b'+5' in head:
+                    await reader.readexactly(5)
+            except Exception:
+                break
+        writer.close()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, proxy):
+            url = f'http://127.0.0.1:{origin_port}'
+            attack = await fetch(port, f'GET {url}/attack HTTP/1.1\r\n'.encode() + framing + b'\r\n\r\n')
+            pooled = proxy._pooled
+            victim = await fetch(port, f'GET {url}/victim HTTP/1.1\r\n\r\n'.encode())
+            return attack, pooled, victim
+    
+    attack, pooled, victim = asyncio.run(run())
+    assert attack.endswith(b'/attack')
+    assert pooled == 0
+    assert victim.startswith(b'HTTP/1.1 200 OK') and victim.endswith(b'/victim')
+
+
+def test_head_requests_leave_the_pool_alone(tmp_path):
+    """HEAD opens its own connection instead of taking and closing a pooled one"""
+    served_by = []
+    
+    async def origin(reader, writer):
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except Exception:
+                break
+            served_by.append((head.split()[0], writer))
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n')
+            if head.startswith(b'GET'):
+                writer.write(b'ok')
+            await writer.drain()
+    
+    async def run():
+        async with serving(origin, tmp_path) as (port, origin_port, proxy):
+            pooled = []
+            for method in ('GET', 'HEAD', 'GET', 'HEAD', 'GET'):
+                await fetch(port, f'{method} http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode())
+                pooled.append(proxy._pooled)
+            return pooled
+    
+    assert asyncio.run(run()) == [1, 1, 1, 1, 1]
+    assert len({id(writer) for method, writer in served_by if method == b'GET'}) == 1
+
+
+def test_handle_client_works_without_start(tmp_path):
+    """An embedder can hand handle_client to its own server"""
+    async def run():
+        origin = await asyncio.start_server(ok_origin, '127.0.0.1', 0)
+        proxy = ProxyServer(log_dir=str(tmp_path), timeout=3)
+        server = await asyncio.start_server(proxy.handle_client, '127.0.0.1', 0)
+        try:
+            origin_port = origin.sockets[0].getsockname()[1]
+            return await fetch(server.sockets[0].getsockname()[1],
+                               f'GET http://127.0.0.1:{origin_port}/ HTTP/1.1\r\n\r\n'.encode())
+        finally:
+            server.close()
+            origin.close()
+            proxy.logger.close()
+    
+    assert asyncio.run(run()).startswith(b'HTTP/1.1 200 OK')